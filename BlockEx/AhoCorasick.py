@@ -0,0 +1,122 @@
+# An Aho-Corasick automaton: finds every occurrence of any of a (large) set of
+# keywords in one pass over the text, instead of trying each keyword, or a
+# regex alternation of all of them, at every position.
+#
+# The keywords and the text can be str or bytes, as long as they're the same.
+class KeywordAutomaton(object):
+    def __init__(self, keywords):
+        self.keywords = []
+        for keyword in keywords:
+            if keyword and keyword not in self.keywords:
+                self.keywords.append(keyword)
+        # For each state, the next state on each symbol, the state to fall
+        # back to when there's no next state, and the keywords (by index) that
+        # end at the state.
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for index, keyword in enumerate(self.keywords):
+            self._addKeyword(index, keyword)
+        self._linkFailures()
+        # The transitions we've worked out through the failure links, cached
+        # per state, so each (state, symbol) is only worked out once.
+        self._delta = [dict(goto) for goto in self._goto]
+        if self.keywords:
+            self.minLength = min(len(keyword) for keyword in self.keywords)
+        else:
+            self.minLength = 0
+
+    def _addKeyword(self, index, keyword):
+        state = 0
+        for symbol in keyword:
+            nextState = self._goto[state].get(symbol)
+            if nextState is None:
+                nextState = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][symbol] = nextState
+            state = nextState
+        self._out[state] = (index,)
+
+    # Breadth first, so a state's failure state is done before its children.
+    def _linkFailures(self):
+        queue = list(self._goto[0].values())
+        position = 0
+        while position < len(queue):
+            state = queue[position]
+            position += 1
+            for symbol, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and symbol not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                failState = self._goto[fallback].get(symbol, 0)
+                if failState == child:
+                    failState = 0
+                self._fail[child] = failState
+                self._out[child] = self._out[child] + self._out[failState]
+
+    def _next(self, state, symbol):
+        delta = self._delta[state]
+        nextState = delta.get(symbol)
+        if nextState is None:
+            if state == 0:
+                nextState = 0
+            else:
+                nextState = self._next(self._fail[state], symbol)
+            delta[symbol] = nextState
+        return nextState
+
+    # Generates (keywordIndex, start, end) for every occurrence of a keyword in
+    # text, overlapping ones included, in the order that they end.
+    def iterMatches(self, text):
+        if len(text) < self.minLength or not self.keywords:
+            return
+        delta = self._delta
+        out = self._out
+        keywords = self.keywords
+        state = 0
+        for position, symbol in enumerate(text):
+            nextState = delta[state].get(symbol)
+            if nextState is None:
+                nextState = self._next(state, symbol)
+            state = nextState
+            if out[state]:
+                end = position + 1
+                for index in out[state]:
+                    yield index, end - len(keywords[index]), end
+
+    # Returns the matches as a list of (keywordIndex, start, end), sorted by
+    # start. If overlapping is False, the leftmost, then longest, match wins,
+    # and the matches that overlap it are dropped, like re.finditer() would.
+    # accept, if given, is called with (text, start, end), and matches that it
+    # returns False for are dropped first.
+    def findAll(self, text, overlapping=False, accept=None):
+        matches = self.iterMatches(text)
+        if accept is not None:
+            matches = [match for match in matches
+                       if accept(text, match[1], match[2])]
+        matches = sorted(matches, key=lambda match: (match[1], -match[2]))
+        if overlapping:
+            return matches
+        selected = []
+        lastEnd = 0
+        for match in matches:
+            if match[1] >= lastEnd:
+                selected.append(match)
+                lastEnd = match[2]
+        return selected
+
+
+def _isWordCharacter(text, index):
+    if index < 0 or index >= len(text):
+        return False
+    character = text[index:index + 1]
+    return character.isalnum() or character in ('_', b'_')
+
+
+# For findAll()'s accept: True if the match isn't part of a longer word.
+def isWholeWord(text, start, end):
+    return not _isWordCharacter(text, start - 1) and \
+        not _isWordCharacter(text, end)
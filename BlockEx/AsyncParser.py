@@ -0,0 +1,223 @@
+from BlockEx.ConnectionPool import sharedSSLContext
+from BlockEx.LineSource import Decompressor, LineSplitter
+from BlockEx.Parser import StreamContext, StreamParser, \
+    encodingFromContentType
+
+import asyncio
+import collections
+import urllib.parse
+
+
+# The result of fetching and parsing one path with parseAll. reason is the
+# reason (or the exception) if the status isn't 200.
+PageResult = collections.namedtuple('PageResult',
+                                    ['path', 'parser', 'status', 'reason'])
+
+
+# An asyncio version of UrlStreamParser. setPath() and parse() are coroutines,
+# so many pages can be fetched and parsed at once (see parseAll()). The lines
+# are handed to the matchers as the body arrives, and redirects are followed.
+#
+# This speaks just enough HTTP/1.1 to GET a page: Content-Length, chunked
+# transfer encoding, and gzip or deflate content encoding.
+class AsyncUrlStreamParser(StreamParser, StreamContext):
+    RedirectStatuses = (301, 302, 303, 307, 308)
+
+    # host: the host, with an optional port, like 'example.com:8080'.
+    # maxRedirects: how many redirects to follow before giving up.
+    # The rest are the same as UrlStreamParser.
+    def __init__(self, host, isSecure=False, bytesMode=False,
+                 acceptCompressed=False, chunkSize=64 * 1024, maxRedirects=5,
+                 maxLines=None, spillToDisk=False, keepOpenBlocks=False):
+        StreamParser.__init__(self)
+        StreamContext.__init__(self, maxLines, spillToDisk, keepOpenBlocks)
+        self.host = host
+        self.isSecure = isSecure
+        self.bytesMode = bytesMode
+        self.acceptCompressed = acceptCompressed
+        self.chunkSize = chunkSize
+        self.maxRedirects = maxRedirects
+        self.isValid = False
+        self.headers = {}
+        self._reader = None
+        self._writer = None
+
+    # Connects, sends the GET for path, and reads the response headers. If the
+    # response is a redirect, we follow it (to another host, if need be).
+    # Returns: (HTTP status, Reason), like UrlStreamParser.setPath(). 200
+    # means okay, and that parse() can be called.
+    async def setPath(self, path):
+        for _ in range(self.maxRedirects + 1):
+            self.reset()
+            self.contextReset()
+            self.isValid = False
+            try:
+                await self._request(path)
+            except (OSError, asyncio.IncompleteReadError, ValueError) as error:
+                print('ERROR: Request for %s failed: %s' % (path, error))
+                self._closeConnection()
+                return (error, None)
+
+            if self.status in self.RedirectStatuses:
+                location = self.headers.get('location')
+                self._closeConnection()
+                if location is None:
+                    return (self.status, None)
+                path = self._followLocation(location)
+                continue
+            elif self.status != 200:
+                self._closeConnection()
+                return (self.status, self.reason)
+
+            encoding = encodingFromContentType(
+                self.headers.get('content-type'))
+            if encoding is not None:
+                self.encoding = encoding
+            self.isValid = True
+            return (self.status, None)
+
+        print('ERROR: Too many redirects for %s' % path)
+        return (self.status, self.headers.get('location'))
+
+    # Points us at the host in location, if it has one, and returns the path.
+    def _followLocation(self, location):
+        parts = urllib.parse.urlsplit(location)
+        if parts.netloc:
+            self.host = parts.netloc
+            self.isSecure = parts.scheme == 'https'
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        return path
+
+    def _hostAndPort(self):
+        parts = urllib.parse.urlsplit('//' + self.host)
+        port = parts.port
+        if port is None:
+            port = 443 if self.isSecure else 80
+        return parts.hostname, port
+
+    async def _request(self, path):
+        hostname, port = self._hostAndPort()
+        context = sharedSSLContext() if self.isSecure else None
+        self._reader, self._writer = await asyncio.open_connection(
+            hostname, port, ssl=context)
+        request = ['GET %s HTTP/1.1' % path,
+                   'Host: %s' % self.host,
+                   'Connection: close']
+        if self.acceptCompressed:
+            request.append('Accept-Encoding: gzip, deflate')
+        self._writer.write(('\r\n'.join(request) + '\r\n\r\n').encode('latin-1'))
+        await self._writer.drain()
+
+        statusLine = (await self._reader.readline()).decode('latin-1')
+        statusParts = statusLine.split(None, 2)
+        if len(statusParts) < 2 or not statusParts[0].startswith('HTTP/'):
+            raise ValueError('Bad status line: %r' % statusLine)
+        self.status = int(statusParts[1])
+        self.reason = statusParts[2].strip() if len(statusParts) > 2 else ''
+        self.headers = await self._readHeaders()
+
+    async def _readHeaders(self):
+        headers = {}
+        while True:
+            line = (await self._reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                return headers
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    # Generates the chunks of the body as they arrive.
+    async def _bodyChunks(self):
+        reader = self._reader
+        if 'chunked' in self.headers.get('transfer-encoding', '').lower():
+            while True:
+                sizeLine = await reader.readline()
+                size = int(sizeLine.split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    # Skip the trailers
+                    await self._readHeaders()
+                    return
+                data = await reader.readexactly(size)
+                await reader.readline()
+                yield data
+        elif 'content-length' in self.headers:
+            remaining = int(self.headers['content-length'])
+            while remaining > 0:
+                data = await reader.read(min(self.chunkSize, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+        else:
+            while True:
+                data = await reader.read(self.chunkSize)
+                if not data:
+                    return
+                yield data
+
+    # Reads the body, handing each line to the matchers as soon as it has
+    # arrived.
+    async def parse(self):
+        self._prepareParse()
+        splitter = LineSplitter(None if self.bytesMode else self.encoding,
+                                self._onDecodeError)
+        decompressor = None
+        contentEncoding = self.headers.get('content-encoding', '')
+        if contentEncoding.strip().lower() not in ('', 'identity'):
+            try:
+                decompressor = Decompressor(contentEncoding)
+            except ValueError as error:
+                print('WARNING: %s. Reading the body as is.' % error)
+        try:
+            async for chunk in self._bodyChunks():
+                if decompressor is not None:
+                    chunk = decompressor.decompress(chunk)
+                if not self._parseLines(splitter.feed(chunk)):
+                    return
+            if decompressor is not None:
+                if not self._parseLines(splitter.feed(decompressor.flush())):
+                    return
+            self._parseLines(splitter.finish())
+        finally:
+            self.completeParsing()
+
+    # Returns False if we stopped early (see StreamParser.stopReason), and
+    # shouldn't read any more of the body.
+    def _parseLines(self, lines):
+        for lineData in lines:
+            self._parseLine(lineData)
+            if self.stopReason is not None:
+                return False
+        return True
+
+    # The lines are pushed to us, so there's never a next line to get.
+    def _getNextLine(self):
+        return b'' if self.bytesMode else ''
+
+    def _closeConnection(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+
+    def _completeParsing(self):
+        self._closeConnection()
+        self.closeContext()
+
+
+# Fetches and parses each of the paths, with at most concurrency of them at a
+# time. parserFactory returns a new AsyncUrlStreamParser (or subclass) for each
+# path. Returns a PageResult for each path, in the order of paths.
+async def parseAll(paths, parserFactory, concurrency=10):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(path):
+        async with semaphore:
+            parser = parserFactory()
+            status, reason = await parser.setPath(path)
+            if status == 200:
+                await parser.parse()
+            return PageResult(path, parser, status, reason)
+
+    return await asyncio.gather(*[fetch(path) for path in paths])
@@ -1,10 +1,35 @@
+from BlockEx.BlockMatchex import bytesRegex
+from BlockEx.Prefilter import buildPrefilter, prefilterStats
+
 import re
 
+
+# Transition tables, by the regexes they're built from. Blocks with the same
+# regexes share a table, so that many instances of a block cost little more
+# than their state.
+_tableCache = {}
+# Number of tables we keep around before starting over.
+_MaxCachedTables = 1024
+
 class BlockBase(object):
     OpeningBlockState = 0       # Block is possibly open
     InsideBlockState  = 1       # We're inside the block
     ClosingBlockState = 2       # Not in the block
 
+    # Fields of each entry in the transition table
+    TableState = 0              # OpeningBlockState or InsideBlockState
+    TableRegex = 1              # The regex to run on the line
+    TableFilter = 2             # The literal prefilter for the regex
+    TableOnMatch = 3            # The index to go to if the regex matches
+    TableOnMiss = 4             # The index to go to if it doesn't
+    TableCallback = 5           # The name of the delegate method to call
+
+    # Subclasses that don't declare __slots__ still get a __dict__, so they
+    # can add whatever they need.
+    __slots__ = ('openingRegexes', 'blockMatchex', 'endingRegex',
+                 '_matchIndex', '_table', '_openers', 'delegate',
+                 '_completedLine', '__weakref__')
+
     # Construct a BlockBase.
     # startingRegexes: sequence of regexes that signifies the start of the
     # block
@@ -20,75 +45,123 @@ class BlockBase(object):
             self.endingRegex = re.compile(endingRegexString)
         else:
             self.endingRegex = None
+        self._buildTable()
+        # Shared opener nodes, when a parser has merged its matchers' openers.
+        # See OpenerTrie.
+        self._openers = None
+        # The line that finishing the block turned the closing line into, if
+        # it changed it (the matchex may add a line). See isFinished.
+        self._completedLine = None
         self.reset()
         self.delegate = None
 
-    def reset(self):
-        if self.openingRegexes is not None:
-            self._matchIndex = 0
-        else:
-            self._matchIndex = -1
+    # Builds the transition table. _matchIndex indexes it: one entry for each
+    # opening regex we're waiting for, and then one for inside the block. Each
+    # entry is (state, regex, prefilter, index on match, index on miss,
+    # delegate callback), so that a line only takes one lookup. The table is
+    # shared with every block that has the same regexes (the prefilters, and
+    # their counts, too).
+    def _buildTable(self):
+        key = (tuple(self.openingRegexes), self.endingRegex)
+        table = _tableCache.get(key)
+        if table is None:
+            if len(_tableCache) >= _MaxCachedTables:
+                _tableCache.clear()
+            table = []
+            # Literals that the regexes need, so we can skip lines without
+            # them before running the regex.
+            for index, regex in enumerate(self.openingRegexes):
+                table.append((self.OpeningBlockState, regex,
+                              buildPrefilter(regex), index + 1, 0,
+                              'onOpeningMatch'))
+            insideIndex = len(self.openingRegexes)
+            table.append((self.InsideBlockState, self.endingRegex,
+                          buildPrefilter(self.endingRegex), 0, insideIndex,
+                          'onClosingMatch'))
+            table = tuple(table)
+            _tableCache[key] = table
+        self._table = table
+
+    # Recompiles the regexes (including the matchex's) to match bytes lines
+    # instead of str, for parsers that don't decode their lines. Captured
+    # groups are decoded with encoding when they are read.
+    def useBytes(self, encoding='utf-8'):
+        self.openingRegexes = [bytesRegex(regex, encoding)
+                               for regex in self.openingRegexes]
+        self.endingRegex = bytesRegex(self.endingRegex, encoding)
+        self._buildTable()
+        self._openers = None
+        self.blockMatchex.useBytes(encoding)
+
+    # Runs the opening regexes, and the ending regex, through the OpenerNodes
+    # (one for each entry of the table that has a regex) instead, so that the
+    # matchers sharing them run each regex once per line. None goes back to
+    # running them ourselves.
+    def useOpeners(self, openers):
+        self._openers = openers
 
+    def reset(self):
+        self._matchIndex = 0
         self.blockMatchex.reset()
 
     def getState(self):
-        # Similar to GetRegex, but a little simpler.
-        if self._matchIndex < 0:
-            return self.InsideBlockState
-        numOpening = len(self.openingRegexes)
-        if self._matchIndex < numOpening:
-            return self.OpeningBlockState
-        elif self._matchIndex == numOpening:
-            return self.InsideBlockState
-        elif self._matchIndex == numOpening + 1 and \
-             self.endingRegex is not None:
-            return self.ClosingBlockState
-        else:
-            # This is an error. Our index stepped past our regexes
-            raise 'Index (%d) is greater than our regexes' % self._matchIndex
+        # The table has a state for every index we can be at.
+        return self._table[self._matchIndex][0]
 
     def _getOpeningRegex(self):
-        if self._matchIndex < 0:
-            return None
-        # Uses the current index to see which match we're currently testing
-        numOpening = len(self.openingRegexes)
-        if self._matchIndex < numOpening:
-            return self.openingRegexes[self._matchIndex]
-        else:
+        entry = self._table[self._matchIndex]
+        if entry[0] != self.OpeningBlockState:
             # This is an error. Our index stepped past our regexes
-            raise 'Index (%d) is greater than our regexes' % self._matchIndex
+            raise IndexError('Index (%d) is past our opening regexes' %
+                             self._matchIndex)
+        return entry[1]
 
     # Return True if we want to set or keep this BlockBase to be the current
     # or to continue processing with this block
     def wantsLine(self, line):
-        state = self.getState()
+        state, regex, prefilter, onMatch, _, callback = \
+            self._table[self._matchIndex]
         if state == self.OpeningBlockState:
             # If we have opening regexes, check the match. If successful,
-            # increment and return true. Else, reset. If xthere are no opening
-            # regexes, state is already InsideBlockState
-            regex = self._getOpeningRegex()
-            match = regex.match(line)
+            # move to the next index and return true. Else, reset. If there
+            # are no opening regexes, state is already InsideBlockState
+            if self._openers is not None:
+                match = self._openers[self._matchIndex].match(line)
+            elif prefilter is not None and prefilter.rejects(line):
+                match = None
+            else:
+                match = regex.match(line)
 
             if match is None:
+                if self._matchIndex > 0 and self.delegate is not None:
+                    self._notifyDelegate('onOpeningReset', self._matchIndex)
                 self.reset()
                 return False
             else:
                 if self.delegate:
-                    self.delegate.onOpeningMatch(self._matchIndex, match)
-                self._matchIndex += 1
+                    getattr(self.delegate, callback)(self._matchIndex, match)
+                self._matchIndex = onMatch
                 return True
-        elif state == self.InsideBlockState:
+        else:
             # There's only one possible match inside the block, but there might
             # be other lines inside that don't match, so we 'want' the line
             # until we hit the closing. For now, we return True. ProcessLine()
             # check to see if we should process the line by checking if we
             # match and passing it to the matchex.
             return True
-        else:
-            # This function should only be handling theOpening and Inside
-            # states!
-            print('WARNING: Unhandled states in WantsLine()!!!')
-            return False
+
+    # Calls the delegate's callback with the name, for the callbacks that
+    # delegates don't have to implement:
+    # o onOpeningReset(index): the opening regex at index (past the first)
+    #   missed, so we're back to waiting for the first one.
+    # o onBlockCompleted(): a block without an ending regex finished, since
+    #   its matchex matched.
+    # o onBlockAbandoned(): the stream ended while we were opening, or in, the
+    #   block. The parser calls this one.
+    def _notifyDelegate(self, name, *args):
+        callback = getattr(self.delegate, name, None)
+        if callback is not None:
+            callback(*args)
 
     # Callback for processLine(), which is called whenever we are inside the
     # block, whether or not it matches the regular expression. We ignore any
@@ -106,9 +179,8 @@ class BlockBase(object):
     #    just looking for the match.
     def processLine(self, line):
         self._processLine(line)
-        state = self.getState()
         didMatch = False
-        if state != self.InsideBlockState:
+        if self._table[self._matchIndex][0] != self.InsideBlockState:
             print('WARNING: Calling processLine when not inside the block')
             return didMatch, line
         else:
@@ -125,7 +197,8 @@ class BlockBase(object):
                 return didMatch, line
 
     def isFinished(self, line):
-        state = self.getState()
+        state, regex, prefilter, _, _, callback = \
+            self._table[self._matchIndex]
         result = False
         if state == self.InsideBlockState:
             # We want to see if we've finished processing, which is indicated
@@ -136,23 +209,48 @@ class BlockBase(object):
             # The result of this rule is that we can continue sending lines
             # to the matchex if we provide a closing regex. Otherwise, hitting
             # the matchex regex means we're done processing.
-            if self.endingRegex is not None:
-                closingMatch = self.endingRegex.match(line)
+            if regex is not None:
+                if self._openers is not None:
+                    closingMatch = self._openers[self._matchIndex].match(line)
+                elif prefilter is not None and prefilter.rejects(line):
+                    closingMatch = None
+                else:
+                    closingMatch = regex.match(line)
                 if closingMatch is not None:
                     if self.delegate is not None:
-                        self.delegate.onClosingMatch(closingMatch)
-                    # Maybe let the Parser call this?
-                    self._finishProcessing(line)
+                        getattr(self.delegate, callback)(closingMatch)
+                    self._completeLine(line)
                     result = True
                     self.reset()
             elif self.blockMatchex.matchFound:
-                # Maybe let the Parser call this?
-                self._finishProcessing(line)
+                if self.delegate is not None:
+                    self._notifyDelegate('onBlockCompleted')
+                self._completeLine(line)
                 result = True
                 self.reset()
 
         return result
 
+    # Returns how many lines the literal prefilters checked and rejected for
+    # this block, including its matchex. If stats is given, the counts are
+    # added to it.
+    def getPrefilterStats(self, stats=None):
+        return prefilterStats(self.getPrefilters(), stats)
+
+    # The literal prefilters of the regexes, including the matchex's.
+    def getPrefilters(self):
+        return [entry[self.TableFilter] for entry in self._table] + \
+            self.blockMatchex.getPrefilters()
+
+    # Keeps what _finishProcessing made of the closing line, or None if it
+    # didn't change it, for the parser to write out.
+    def _completeLine(self, line):
+        updated = self._finishProcessing(line)
+        if updated is line:
+            self._completedLine = None
+        else:
+            self._completedLine = updated
+
     def _finishProcessing(self, line):
         # I'm not exactly sure what I was doing here. We need to
         # return a new line if we are "processing" e.g. modifying the
@@ -162,7 +260,8 @@ class BlockBase(object):
         # for, so we create a new line.
         completeLine = self.blockMatchex.getCompleteLine()
         if completeLine is not None:
-            updated = '%s%s' % (completeLine, line)
+            # The line may be str or bytes, so we just add them.
+            updated = completeLine + line
             return updated
         else:
             return line
@@ -1,30 +1,127 @@
+from BlockEx.AhoCorasick import KeywordAutomaton, isWholeWord
+from BlockEx.Prefilter import buildPrefilter, prefilterStats
+
 import re
-import types
+
+
+# Recompiles a str regex to match bytes, encoding the pattern with encoding.
+# The patterns should be ASCII, since character classes like \w only match
+# ASCII when matching bytes.
+def bytesRegex(regex, encoding):
+    if regex is None or isinstance(regex.pattern, bytes):
+        return regex
+    return re.compile(regex.pattern.encode(encoding),
+                      regex.flags & ~re.UNICODE)
+
+
+# Decodes the bytes (or the bytes in the lists and tuples) in value.
+def decodeResult(value, encoding):
+    if isinstance(value, bytes):
+        return value.decode(encoding)
+    elif isinstance(value, (list, tuple)):
+        return type(value)(decodeResult(v, encoding) for v in value)
+    return value
+
+
+# Holds the results of a match (groups, matchStrings). The matchex can store
+# what it captured with _setResult, or, if the descriptor has a build function,
+# just the match, and the result is built from it (and decoded, in bytes mode)
+# the first time it is read.
+class _LazyResult(object):
+    def __init__(self, name, build=None):
+        self.name = name
+        self.build = build
+        self.valueName = '_' + name
+        self.rawName = '_raw' + name[0].upper() + name[1:]
+
+    def __get__(self, matchex, cls):
+        if matchex is None:
+            return self
+        raw = getattr(matchex, self.rawName, None)
+        if raw is not None:
+            if self.build is not None:
+                raw = self.build(raw)
+            if matchex._encoding is not None:
+                raw = decodeResult(raw, matchex._encoding)
+            setattr(matchex, self.valueName, raw)
+            setattr(matchex, self.rawName, None)
+        return getattr(matchex, self.valueName)
+
+    def __set__(self, matchex, value):
+        setattr(matchex, self.valueName, value)
+        setattr(matchex, self.rawName, None)
 
 
 # A Regular expression and what to do with it.
 class BlockMatchex(object):
+    # Subclasses that don't declare __slots__ still get a __dict__.
+    __slots__ = ('_flags', '_blockFilter', 'blockRegex', 'matchFound',
+                 'previousLine', '_lastMatch', '_encoding', '__weakref__')
+
     # Params:
     # o indentRegex: regex to capture the indentation so that we can apply the
     #   same indentation pattern to the lines that we add
-    # o blockRegex: pattern for the line we are hoping to modify
+    # o blockRegex: pattern for the line we are hoping to modify. None for
+    #   subclasses that don't match with a regex.
     def __init__(self, blockRegex, flags=None):
         self._flags = flags
+        self._blockFilter = None
+        self.blockRegex = None
         # calls the property setter
         try:
-            if self._flags is not None:
+            if blockRegex is None:
+                pass
+            elif self._flags is not None:
                 self.blockRegex = re.compile(blockRegex, self._flags)
             else:
                 self.blockRegex = re.compile(blockRegex)
+            self._blockFilter = buildPrefilter(self.blockRegex)
         except:
             print('EXCEPTION: Bad expression [%s]' % blockRegex)
             print('BlockMatchex is not complete')
         self.matchFound = False
         self.previousLine = None
+        # What the last match was made from. See getMatchGroups().
+        self._lastMatch = None
+        # Set when we're matching bytes instead of str.
+        self._encoding = None
+
+    # Switches the matchex to match bytes lines. The results are decoded with
+    # encoding when they're read.
+    def useBytes(self, encoding='utf-8'):
+        self._encoding = encoding
+        self.blockRegex = bytesRegex(self.blockRegex, encoding)
+        self._blockFilter = buildPrefilter(self.blockRegex)
+
+    @property
+    def isBytes(self):
+        return self._encoding is not None
+
+    # Stores the result under name ('groups' or 'matchStrings'). If we're
+    # matching bytes, it's decoded when it's read.
+    def _setResult(self, name, value):
+        if self._encoding is not None:
+            setattr(self, '_raw' + name[0].upper() + name[1:], value)
+        else:
+            setattr(self, name, value)
 
     def reset(self):
         self.matchFound = False
         self.previousLine = None
+        self._lastMatch = None
+
+    # Returns (groups, spans) for the last match: a tuple of the captured
+    # strings, and a tuple of their (start, end) in the line, read straight
+    # from the match.
+    def getMatchGroups(self):
+        match = self._lastMatch
+        if match is None or not hasattr(match, 'span'):
+            return (), ()
+        groups = match.groups()
+        if self._encoding is not None:
+            groups = decodeResult(groups, self._encoding)
+        return groups, tuple(match.span(i)
+                             for i in range(1, len(groups) + 1))
 
     # Takes the regex match object, and line
     def _processLine(self, matchObj, line):
@@ -39,75 +136,128 @@ class BlockMatchex(object):
     def testMatch(self, line):
         return self._match(line)
 
+    # True if the line doesn't have the literals that the regex needs, so we
+    # don't need to run it.
+    def _rejects(self, line):
+        return self._blockFilter is not None and \
+            self._blockFilter.rejects(line)
+
+    def getPrefilterStats(self, stats=None):
+        return prefilterStats(self.getPrefilters(), stats)
+
+    def getPrefilters(self):
+        return [self._blockFilter]
+
     def _match(self, line):
+        if self._rejects(line):
+            return None
         return self.blockRegex.match(line)
 
     def matchLine(self, line, previousMatchResult):
         self.previousLine = line
         if previousMatchResult is None:
-            match = self.blockRegex.match(line)
+            match = self._match(line)
         else:
             match = previousMatchResult
         if match:
             self.matchFound = True
+            self._lastMatch = match
             return self._processLine(match, line)
         return line
 
 
+# The (string, (start, end)) of each group in the match.
+def _patternGroups(matchObj):
+    return [(matchObj.group(i), matchObj.span(i))
+            for i in range(1, matchObj.re.groups + 1)]
+
+
+# The string of each group in the match.
+def _patternMatchStrings(matchObj):
+    return list(matchObj.groups())
+
+
 # On a match on the regular expression, gets the groups marked in the regular
 # expression.
 # XXX - We should also just have a boolean in case we just want to know if
 # there was a match and we don't care about what was in the match
 class PatternMatchex(BlockMatchex):
+    groups = _LazyResult('groups', _patternGroups)
+    matchStrings = _LazyResult('matchStrings', _patternMatchStrings)
+    __slots__ = ('_groups', '_rawGroups', '_matchStrings', '_rawMatchStrings')
+
     def __init__(self, blockRegex, flags=None):
         super(PatternMatchex, self).__init__(blockRegex, flags)
         self.matchStrings = []
         self.groups = []
 
+    # groups and matchStrings are built from the match when they're read.
     def _processLine(self, matchObj, line):
-        matchStrings = []
-        groups = []
-        numGroups = len(matchObj.groups())
-        if numGroups > 0:
-            for i in (1, len(matchObj.groups())):
-                matchStr = matchObj.group(i)
-                matchStrings.append(matchStr)
-                groups.append((matchStr, (matchObj.start(i), matchObj.end(i))))
-            self.groups = groups
-            self.matchStrings = matchStrings
+        if matchObj.re.groups > 0:
+            self._rawGroups = matchObj
+            self._rawMatchStrings = matchObj
 
         return line
 
 
 # If we just want to find all the occurences
 class FindAllMatchex(BlockMatchex):
+    groups = _LazyResult('groups')
+    __slots__ = ('_groups', '_rawGroups')
+
     def __init__(self, blockRegex, findAll=True, flags=None):
         super(FindAllMatchex, self).__init__(blockRegex, flags)
         self.groups = []
 
+    # Returns the matches in line. An empty list if there are none.
+    def _findAll(self, line):
+        return self.blockRegex.findall(line)
+
+    # Stores what _findAll() returned.
+    def _setMatches(self, matches):
+        self._setResult('groups', matches)
+
+    # Returns the matches, so that matchLine doesn't have to find them again.
     def _match(self, line):
-        if len(self.blockRegex.findall(line)) == 0:
+        if self._rejects(line):
             return None
-        else:
-            return True
+        return self._findAll(line) or None
 
     def matchLine(self, line, previousMatchResult):
-        # We do another match, so we don't use the previousMatchResult
         self.previousLine = line
-        matches = self.blockRegex.findall(line)
+        if isinstance(previousMatchResult, list):
+            matches = previousMatchResult
+        elif self._rejects(line):
+            return line
+        else:
+            matches = self._findAll(line)
         if matches:
             self.matchFound = True
-            self.groups = matches
+            self._lastMatch = matches
+            self._setMatches(matches)
             return self._processLine(matches, line)
         return line
 
+    # The spans aren't known, since findall() doesn't return them, so they're
+    # None.
+    def getMatchGroups(self):
+        if not self._lastMatch:
+            return (), None
+        groups = tuple(self._lastMatch)
+        if self._encoding is not None:
+            groups = decodeResult(groups, self._encoding)
+        return groups, None
+
 
 # We find all the patterns that match the expression (like FindAllMatchex), and
-# then create a new expression to find the locations of all those matches
-# (like PatternMatchex).
+# get the locations of all those matches (like PatternMatchex), in the same
+# scan of the line.
 class MultiPatternMatchex(FindAllMatchex):
+    matchStrings = _LazyResult('matchStrings')
+    __slots__ = ('_matchStrings', '_rawMatchStrings', '_secondaryMatchString')
+
     def __init__(self, blockRegex, flags=None):
-        super(MultiPatternMatchex, self).__init__(blockRegex, flags)
+        super(MultiPatternMatchex, self).__init__(blockRegex, flags=flags)
         self._secondaryMatchString = None
         self.groups = []
         self.matchStrings = []
@@ -120,27 +270,91 @@ class MultiPatternMatchex(FindAllMatchex):
 
         return regex
 
-    # FindAll's matchLine calls us.
-    def _processLine(self, matchObj, line):
-        matchesIt = self.blockRegex.finditer(line)
-        if matchesIt:
-            groups = []
-            matchStrings = []
-            for mIt in matchesIt:
-                matchStr = mIt.groups()[0]
-                matchStrings.append(matchStr)
-                groups.append((matchStr, (mIt.start(),
-                                          mIt.end())))
-            self.groups = groups
-            self.matchStrings = matchStrings
+    def _findAll(self, line):
+        return list(self.blockRegex.finditer(line))
 
-        return line
+    def _setMatches(self, matches):
+        groups = []
+        matchStrings = []
+        for mIt in matches:
+            matchStr = mIt.groups()[0]
+            matchStrings.append(matchStr)
+            groups.append((matchStr, (mIt.start(),
+                                      mIt.end())))
+        self._setResult('groups', groups)
+        self._setResult('matchStrings', matchStrings)
+
+    def getMatchGroups(self):
+        if not self._lastMatch:
+            return (), ()
+        groups = tuple(mIt.groups()[0] for mIt in self._lastMatch)
+        if self._encoding is not None:
+            groups = decodeResult(groups, self._encoding)
+        return groups, tuple(mIt.span() for mIt in self._lastMatch)
+
+
+# Finds any of a large set of keywords (target names, file references, and
+# such) in the line, like a MultiPatternMatchex with an alternation of all of
+# them, but with an Aho-Corasick automaton, so the line is scanned once no
+# matter how many keywords there are. groups is a list of
+# (keyword, (start, end)), and matchStrings the keywords, in the order that
+# they're in the line.
+class KeywordMatchex(FindAllMatchex):
+    matchStrings = _LazyResult('matchStrings')
+    __slots__ = ('_matchStrings', '_rawMatchStrings', 'keywords',
+                 'overlapping', 'wholeWords', 'automaton')
+
+    # Params:
+    # o keywords: the strings to look for
+    # o overlapping: if True, every occurrence is found, even the ones inside
+    #   or overlapping another. Otherwise, the leftmost, then longest, wins.
+    # o wholeWords: if True, keywords that are part of a longer word (letters,
+    #   digits and '_') don't count.
+    def __init__(self, keywords, overlapping=False, wholeWords=False):
+        super(KeywordMatchex, self).__init__(None)
+        self.keywords = list(keywords)
+        self.overlapping = overlapping
+        self.wholeWords = wholeWords
+        self.automaton = KeywordAutomaton(self.keywords)
+        self.groups = []
+        self.matchStrings = []
+
+    def useBytes(self, encoding='utf-8'):
+        super(KeywordMatchex, self).useBytes(encoding)
+        self.automaton = KeywordAutomaton(
+            [keyword.encode(encoding) for keyword in self.keywords])
+
+    def _findAll(self, line):
+        return self.automaton.findAll(
+            line, self.overlapping, isWholeWord if self.wholeWords else None)
+
+    def _setMatches(self, matches):
+        keywords = self.automaton.keywords
+        groups = []
+        matchStrings = []
+        for index, start, end in matches:
+            matchStrings.append(keywords[index])
+            groups.append((keywords[index], (start, end)))
+        self._setResult('groups', groups)
+        self._setResult('matchStrings', matchStrings)
+
+    def getMatchGroups(self):
+        if not self._lastMatch:
+            return (), ()
+        keywords = self.automaton.keywords
+        groups = tuple(keywords[index] for index, _, _ in self._lastMatch)
+        if self._encoding is not None:
+            groups = decodeResult(groups, self._encoding)
+        return groups, tuple((start, end) for _, start, end
+                             in self._lastMatch)
 
 
 # Matchex to find a key in a string and check the values. If it doesn't contain
 # all the values we need, we add them. If the line doesn't exist at all, we
 # create the line with the necessary values.
 class DictMatchex(BlockMatchex):
+    __slots__ = ('indentRegex', 'key', 'value', 'expectedValues')
+
     # Params:
     # o indentRegex: regex to capture the indentation so that we can apply the
     #   same indentation pattern to the lines, in case we need to create the
@@ -155,36 +369,55 @@ class DictMatchex(BlockMatchex):
     # o blockRegex: pattern for the line we are hoping to modify
     def __init__(self, indentRegex, blockRegex, key, value, expectedValues):
         super(DictMatchex, self).__init__(blockRegex)
+        self.indentRegex = re.compile(indentRegex)
         self.key = key
         self.value = value
         # could be a string or list type.
         self.expectedValues = expectedValues
 
+    def useBytes(self, encoding='utf-8'):
+        super(DictMatchex, self).useBytes(encoding)
+        self.indentRegex = bytesRegex(self.indentRegex, encoding)
+
+    # Encodes text if we're matching bytes, so that we can put it in the line.
+    def _lineText(self, text):
+        if self._encoding is not None:
+            return text.encode(self._encoding)
+        return text
+
     def _getValueString(self):
-        if isinstance(self.expectedValues, types.ListType):
+        if isinstance(self.expectedValues, list):
             newVals = self.expectedValues[:]
             newVals.append(self.value)
             return ' '.join(newVals)
+        return '%s %s' % (self.expectedValues, self.value)
 
     def _processLine(self, matchObj, line):
         oldVals = matchObj.group(1)
+        value = self._lineText(self.value)
         vals = oldVals.split()
         hasVal = False
         for val in vals:
-            if val == self.value:
+            if val == value:
                 hasVal = True
                 break
         if not hasVal:
-            vals.append(self.value)
-            newVals = ' '.join(vals)
+            vals.append(value)
+            newVals = self._lineText(' ').join(vals)
             return line.replace(oldVals, newVals)
 
         return line
 
     def getCompleteLine(self):
+        # We only need to create the line if the block didn't have one, and
+        # we need a line to take the indentation from.
+        if self.matchFound or self.previousLine is None:
+            return None
         prevMatch = self.indentRegex.match(self.previousLine)
+        if prevMatch is None:
+            return None
         prevIndent = prevMatch.group(1)
         # For bool values, we don't want to quote them.  But, since we're only
         # doing this for one type of value so far, let's not compliate things.
-        return '%s%s = \"%s\";\n' % (prevIndent, self.key,
-                                     self._getValueString())
+        return prevIndent + self._lineText('%s = \"%s\";\n' %
+                                           (self.key, self._getValueString()))
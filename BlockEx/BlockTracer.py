@@ -0,0 +1,154 @@
+import json
+import time
+
+
+# Records what one matcher's block does, as its delegate, and passes the
+# callbacks on to the delegate it had before.
+class _MatcherTrace(object):
+    def __init__(self, tracer, index, matcher):
+        self.tracer = tracer
+        self.index = index
+        self.matcher = matcher
+        self.delegate = matcher.delegate
+        self.numOpeners = len(matcher.openingRegexes)
+        # Where (line, time) the current opener sequence or block started,
+        # or None.
+        self._openingStart = None
+        self._blockStart = None
+
+    def _forward(self, name, *args):
+        if self.delegate is not None:
+            callback = getattr(self.delegate, name, None)
+            if callback is not None:
+                callback(*args)
+
+    def _endOpening(self, outcome):
+        self.tracer.addSpan(self.index, 'opening', self._openingStart,
+                            outcome)
+        self._openingStart = None
+
+    def _endBlock(self, outcome):
+        if self._blockStart is not None:
+            self.tracer.addSpan(self.index, 'block', self._blockStart,
+                                outcome)
+            self._blockStart = None
+
+    def onOpeningMatch(self, index, match):
+        if index == 0:
+            self._openingStart = self.tracer.now()
+        if index == self.numOpeners - 1:
+            self._endOpening('opened')
+            self._blockStart = self.tracer.now()
+        self._forward('onOpeningMatch', index, match)
+
+    def onOpeningReset(self, index):
+        if self._openingStart is not None:
+            self._endOpening('reset at opener %d' % index)
+        self._forward('onOpeningReset', index)
+
+    def onRegexMatch(self, match):
+        self.tracer.addInstant(self.index, 'match')
+        self._forward('onRegexMatch', match)
+
+    def onClosingMatch(self, match):
+        self._endBlock('closed')
+        self._forward('onClosingMatch', match)
+
+    def onBlockCompleted(self):
+        self._endBlock('completed')
+        self._forward('onBlockCompleted')
+
+    def onBlockAbandoned(self):
+        if self._openingStart is not None:
+            self._endOpening('abandoned')
+        self._endBlock('abandoned')
+        self.tracer.addInstant(self.index, 'abandoned')
+        self._forward('onBlockAbandoned')
+
+
+# Traces where the blocks of a parser's matchers open and close, and how long
+# each opener sequence lives before the block opens or it resets, as Chrome
+# trace events (chrome://tracing, or Perfetto). Each matcher gets its own row:
+# opener sequences and blocks are spans, and matches and abandoned blocks are
+# instants. The line numbers they start and end at are in their args.
+#
+# The tracer becomes the delegate of the matchers, and passes the callbacks on
+# to the delegates they had, so create it once the matchers (and their
+# delegates) are set, and before parsing.
+#
+# useLineNumbers: if True, the timeline is in lines (one line is one
+#   microsecond) instead of time, so it shows where in the stream things
+#   happen.
+# maxEvents: after this many events, the rest are counted, but not kept.
+class BlockTracer(object):
+    def __init__(self, parser, useLineNumbers=False, maxEvents=1000000):
+        self.parser = parser
+        self.useLineNumbers = useLineNumbers
+        self.maxEvents = maxEvents
+        self.events = []
+        self.droppedEvents = 0
+        self._startTime = time.perf_counter()
+        self._traces = []
+        # The name of each matcher's row
+        self._rows = []
+        for index, matcher in enumerate(parser.blockMatchers):
+            trace = _MatcherTrace(self, index, matcher)
+            matcher.delegate = trace
+            self._traces.append(trace)
+            self._rows.append((index, type(matcher).__name__))
+
+    # Gives the matchers their own delegates back.
+    def detach(self):
+        for trace in self._traces:
+            trace.matcher.delegate = trace.delegate
+        self._traces = []
+
+    # The line being parsed, and the timestamp (in microseconds) for it.
+    def now(self):
+        lineNumber = self.parser.lineNumber
+        if self.useLineNumbers:
+            return lineNumber, float(lineNumber)
+        return lineNumber, (time.perf_counter() - self._startTime) * 1e6
+
+    def _add(self, event):
+        if len(self.events) >= self.maxEvents:
+            self.droppedEvents += 1
+        else:
+            self.events.append(event)
+
+    # Adds a span for the matcher at index, from start (what now() returned)
+    # until now.
+    def addSpan(self, index, name, start, outcome):
+        startLine, startTime = start
+        endLine, endTime = self.now()
+        if self.useLineNumbers:
+            # So that a span on one line still shows.
+            endTime += 1
+        self._add({'name': name, 'cat': outcome, 'ph': 'X', 'pid': 0,
+                   'tid': index, 'ts': startTime,
+                   'dur': endTime - startTime,
+                   'args': {'startLine': startLine, 'endLine': endLine,
+                            'outcome': outcome}})
+
+    def addInstant(self, index, name):
+        lineNumber, timestamp = self.now()
+        self._add({'name': name, 'ph': 'i', 's': 't', 'pid': 0,
+                   'tid': index, 'ts': timestamp,
+                   'args': {'line': lineNumber}})
+
+    # The events, with the names of the rows, in the trace event format.
+    def getTrace(self):
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': index,
+                     'args': {'name': '%d %s' % (index, name)}}
+                    for index, name in self._rows]
+        metadata.append({'name': 'process_name', 'ph': 'M', 'pid': 0,
+                         'args': {'name': type(self.parser).__name__}})
+        return {'traceEvents': metadata + self.events,
+                'displayTimeUnit': 'ms',
+                'otherData': {'droppedEvents': self.droppedEvents,
+                              'timeline': 'lines' if self.useLineNumbers
+                              else 'time'}}
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as stream:
+            json.dump(self.getTrace(), stream)
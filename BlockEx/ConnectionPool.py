@@ -0,0 +1,98 @@
+import http.client
+import ssl
+import threading
+
+
+_sslContext = None
+_sslContextLock = threading.Lock()
+
+
+# The SSL context for every secure connection. Building one loads the
+# certificates and settles the ciphers, which is slow, so it's only done once
+# per process.
+def sharedSSLContext():
+    global _sslContext
+    with _sslContextLock:
+        if _sslContext is None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.minimum_version = ssl.TLSVersion.TLSv1_2
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            _sslContext = context
+        return _sslContext
+
+
+# Keeps the connections that are done with a response open, per host, so the
+# next request to that host doesn't have to connect (and shake hands) again.
+# Connections are handed out by acquire(), and given back with release() if
+# they can be used again, or discard() if they can't.
+class ConnectionPool(object):
+    # maxIdlePerHost: how many open connections to keep for each host. The
+    #   rest are closed when they're released.
+    def __init__(self, maxIdlePerHost=4):
+        self.maxIdlePerHost = maxIdlePerHost
+        self._idle = {}
+        self._lock = threading.Lock()
+        # How many connections were opened, and how many were reused.
+        self.opened = 0
+        self.reused = 0
+
+    # Returns (connection, isReused). A reused connection may have been closed
+    # by the server since, so if the request fails, discard it and try again
+    # with a new one.
+    def acquire(self, host, isSecure=False):
+        key = (host, isSecure)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.reused += 1
+                return idle.pop(), True
+            self.opened += 1
+        if isSecure:
+            connection = http.client.HTTPSConnection(
+                host, context=sharedSSLContext())
+        else:
+            connection = http.client.HTTPConnection(host)
+        return connection, False
+
+    # Gives back a connection that has read all of its response.
+    def release(self, host, isSecure, connection):
+        key = (host, isSecure)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxIdlePerHost:
+                idle.append(connection)
+                return
+        connection.close()
+
+    # Closes a connection that can't be used again, like one with the rest of
+    # a response we didn't read.
+    def discard(self, connection):
+        connection.close()
+
+    def getIdleCount(self, host=None, isSecure=False):
+        with self._lock:
+            if host is not None:
+                return len(self._idle.get((host, isSecure), []))
+            return sum(len(idle) for idle in self._idle.values())
+
+    def close(self):
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+_defaultPool = None
+_defaultPoolLock = threading.Lock()
+
+
+# The pool that UrlStreamParsers share, unless they're given one.
+def defaultPool():
+    global _defaultPool
+    with _defaultPoolLock:
+        if _defaultPool is None:
+            _defaultPool = ConnectionPool()
+        return _defaultPool
@@ -0,0 +1,224 @@
+import errno
+import os
+import re
+import shutil
+import tempfile
+
+
+# How much of the source to look through, or copy, at a time.
+ChunkSize = 1024 * 1024
+
+# Line endings, as a file opened in text mode splits lines on them, and as one
+# opened in binary mode does.
+_UniversalNewline = re.compile(br'\r\n|\r|\n')
+_Newline = re.compile(br'\n')
+
+# What the system calls fail with when they can't copy between the files we
+# gave them, so we try the next way.
+_Unsupported = set(getattr(errno, name) for name in
+                   ('ENOSYS', 'EXDEV', 'EINVAL', 'EOPNOTSUPP', 'ENOTSUP',
+                    'EBADF', 'ETXTBSY', 'ENOTSOCK')
+                   if hasattr(errno, name))
+
+
+def _writeAll(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+# The ways to copy a span of one file to the end of another, fastest first.
+# Each returns how many bytes it copied, 0 at the end of the source.
+def _copyFileRange(source, dest, offset, count):
+    return os.copy_file_range(source, dest, count, offset)
+
+
+def _sendFile(source, dest, offset, count):
+    return os.sendfile(dest, source, offset, count)
+
+
+def _readWrite(source, dest, offset, count):
+    os.lseek(source, offset, os.SEEK_SET)
+    data = os.read(source, min(count, ChunkSize))
+    _writeAll(dest, data)
+    return len(data)
+
+
+_Copiers = [copier for name, copier in (('copy_file_range', _copyFileRange),
+                                        ('sendfile', _sendFile))
+            if hasattr(os, name)] + [_readWrite]
+
+
+# Copies count bytes of the source file descriptor, from offset, to where the
+# dest file descriptor is. If count is None, it's the rest of the source. The
+# kernel does the copying if it can, so the bytes don't pass through us.
+def copySpan(source, dest, offset, count=None):
+    if count is None:
+        count = os.fstat(source).st_size - offset
+    copiers = list(_Copiers)
+    while count > 0:
+        try:
+            copied = copiers[0](source, dest, offset, count)
+        except OSError as err:
+            if err.errno not in _Unsupported or len(copiers) == 1:
+                raise
+            copiers.pop(0)
+            continue
+        if copied == 0:
+            break
+        offset += copied
+        count -= copied
+
+
+# Finds the given lines of the file at path, without splitting all of them.
+# Returns (lineNumber, start, end, ending) for each one that is in the file, in
+# order, where start and end are the byte offsets of the line, including its
+# ending, and ending is the bytes it ends with.
+# universal: if True, lines end like they do in text mode, otherwise only on
+#   b'\n'.
+def findLines(path, lineNumbers, universal=True):
+    newline = _UniversalNewline if universal else _Newline
+    wanted = iter(sorted(lineNumbers))
+    target = next(wanted, None)
+    spans = []
+    # The number of the line that starts at lineStart
+    lineNumber = 0
+    lineStart = 0
+    # Where the next read starts, and what's been held back from the last one.
+    position = 0
+    carry = b''
+    with open(path, 'rb') as stream:
+        while target is not None:
+            chunk = stream.read(ChunkSize)
+            final = not chunk
+            chunkStart = position - len(carry)
+            position += len(chunk)
+            data = carry + chunk
+            carry = b''
+            if universal and not final and data[-1:] == b'\r':
+                # The '\n' might be in the next chunk.
+                data, carry = data[:-1], b'\r'
+            if universal:
+                numNewlines = data.count(b'\n') + data.count(b'\r') - \
+                    data.count(b'\r\n')
+            else:
+                numNewlines = data.count(b'\n')
+            if target >= lineNumber + numNewlines:
+                # The line doesn't end in this chunk, so there's no need to
+                # look at each of them.
+                if numNewlines:
+                    lastEnd = data.rfind(b'\n')
+                    if universal:
+                        lastEnd = max(lastEnd, data.rfind(b'\r'))
+                    lineNumber += numNewlines
+                    lineStart = chunkStart + lastEnd + 1
+            else:
+                for match in newline.finditer(data):
+                    if lineNumber == target:
+                        spans.append((target, lineStart,
+                                      chunkStart + match.end(), match.group()))
+                        target = next(wanted, None)
+                        if target is None:
+                            break
+                    lineNumber += 1
+                    lineStart = chunkStart + match.end()
+            if final:
+                # The last line doesn't have to end with a newline.
+                if target == lineNumber and lineStart < position:
+                    spans.append((target, lineStart, position, b''))
+                break
+    return spans
+
+
+# The lines that the matchexes changed while parsing, by line number, so that
+# only they need to be written. The rest of the output is copied from the
+# source file in bulk when we're done, and if nothing changed, there's no
+# output at all.
+class LineEdits(object):
+    # bytesMode: if True, the lines are bytes, split on b'\n'. Otherwise, they
+    #   are text split like a file opened in text mode, and they're encoded
+    #   with encoding.
+    def __init__(self, bytesMode=False, encoding='utf-8'):
+        self.bytesMode = bytesMode
+        self.encoding = encoding
+        self.edits = {}
+
+    # line replaces the line with the number (starting at 0). It may be more
+    # than one line, if lines were added.
+    def record(self, lineNumber, line):
+        self.edits[lineNumber] = line
+
+    def hasEdits(self):
+        return len(self.edits) > 0
+
+    # The bytes to write for line, in place of the source line that ended
+    # with ending. Text lines end with '\n', so they get the source's line
+    # ending back.
+    def _lineBytes(self, line, ending):
+        if self.bytesMode:
+            return line
+        data = line.encode(self.encoding)
+        if ending and ending != b'\n':
+            data = data.replace(b'\n', ending)
+        return data
+
+    # Writes the source file, with the lines replaced, to the file descriptor
+    # dest.
+    def _writeTo(self, sourcePath, dest):
+        spans = findLines(sourcePath, self.edits, not self.bytesMode)
+        with open(sourcePath, 'rb') as sourceStream:
+            source = sourceStream.fileno()
+            position = 0
+            for lineNumber, start, end, ending in spans:
+                copySpan(source, dest, position, start - position)
+                _writeAll(dest, self._lineBytes(self.edits[lineNumber],
+                                                ending))
+                position = end
+            copySpan(source, dest, position)
+
+    # Writes the edited source to outputPath, or, if inPlace is True, over
+    # the source. Replacing the source is atomic: the output goes to a
+    # temporary file next to it, which is synced and then renamed over it.
+    # Returns True if anything was written. If there are no edits, nothing
+    # is.
+    def apply(self, sourcePath, outputPath=None, inPlace=False):
+        if not self.edits:
+            return False
+        if not inPlace:
+            fd = os.open(outputPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o666)
+            try:
+                self._writeTo(sourcePath, fd)
+            finally:
+                os.close(fd)
+            return True
+
+        directory = os.path.dirname(os.path.abspath(sourcePath))
+        fd, tempPath = tempfile.mkstemp(
+            prefix='.%s.' % os.path.basename(sourcePath), suffix='.tmp',
+            dir=directory)
+        try:
+            try:
+                self._writeTo(sourcePath, fd)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            shutil.copymode(sourcePath, tempPath)
+            os.replace(tempPath, sourcePath)
+        except BaseException:
+            if os.path.exists(tempPath):
+                os.unlink(tempPath)
+            raise
+        _syncDirectory(directory)
+        return True
+
+
+# Makes the rename in the directory stick, where the system lets us.
+def _syncDirectory(directory):
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,245 @@
+import codecs
+import io
+import mmap
+import re
+import zlib
+
+
+# str.splitlines() is the fastest way to split the chunk, but it also splits
+# on these, which readline() doesn't.
+_OtherLineBreaks = re.compile('[\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+
+
+# Decodes chunks of bytes, and splits them into lines. Chunks are fed in as
+# they arrive, and feed() returns the lines they complete. The rest is kept
+# until the next chunk, or finish().
+#
+# Newlines are translated like text mode files: '\r\n' and '\r' both become
+# '\n'. If there is no encoding, the lines are bytes, split on b'\n' like a
+# file opened in binary mode, and nothing is translated.
+class LineSplitter(object):
+    # encoding: what to decode the bytes as, or None to keep them as bytes.
+    # onDecodeError: called with the UnicodeDecodeError and the chunk if the
+    #   chunk can't be decoded. The bad bytes are replaced, so no lines are
+    #   lost.
+    def __init__(self, encoding='utf-8', onDecodeError=None):
+        self.encoding = encoding
+        self._onDecodeError = onDecodeError
+        if encoding is not None:
+            self._decoder = codecs.getincrementaldecoder(encoding)()
+            self.empty = ''
+        else:
+            self._decoder = None
+            self.empty = b''
+        self._tail = self.empty
+
+    def _decode(self, chunk, final=False):
+        if self._decoder is None:
+            return chunk
+        try:
+            return self._decoder.decode(chunk, final)
+        except UnicodeDecodeError as uniErr:
+            if self._onDecodeError is not None:
+                self._onDecodeError(uniErr, chunk)
+            # Pick up where the decoder left off, replacing what we can't
+            # decode.
+            replacing = codecs.getincrementaldecoder(self.encoding)('replace')
+            replacing.setstate(self._decoder.getstate())
+            text = replacing.decode(chunk, final)
+            self._decoder.setstate(replacing.getstate())
+            return text
+
+    # Returns the lines that chunk completes.
+    def feed(self, chunk):
+        return self._split(self._tail + self._decode(chunk), False)
+
+    # Returns the rest of the lines. The last one may not end with a newline.
+    def finish(self):
+        return self._split(self._tail + self._decode(b'', final=True), True)
+
+    def _split(self, text, final):
+        self._tail = self.empty
+        if not text:
+            return []
+        if self._decoder is None:
+            lines = io.BytesIO(text).readlines()
+            if not final and lines[-1][-1:] != b'\n':
+                self._tail = lines.pop()
+            return lines
+        if '\r' in text:
+            if text[-1] == '\r' and not final:
+                # The '\n' might be in the next chunk.
+                text, self._tail = text[:-1], '\r'
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        lines = self._splitLines(text)
+        if not final and lines and lines[-1][-1] != '\n':
+            self._tail = lines.pop() + self._tail
+        return lines
+
+    def _splitLines(self, text):
+        if _OtherLineBreaks.search(text) is None:
+            return text.splitlines(True)
+        parts = text.split('\n')
+        last = parts.pop()
+        lines = [part + '\n' for part in parts]
+        if last:
+            lines.append(last)
+        return lines
+
+
+# Reads the raw stream in large chunks, and splits them into lines with a
+# LineSplitter. readline() hands them out one at a time, like a file opened in
+# text mode, and iterLines() hands them out without the per line method call.
+class ChunkedLineSource(object):
+    DefaultChunkSize = 1024 * 1024
+
+    # rawStream: anything with read(size) that returns bytes: a file opened
+    #   in binary mode, an mmap, a socket file, etc.
+    # encoding: what to decode the bytes as, or None to keep them as bytes.
+    # chunkSize: how many bytes to read at a time.
+    # closeables: extra objects to close when the source is closed.
+    # onDecodeError: see LineSplitter.
+    def __init__(self, rawStream, encoding='utf-8',
+                 chunkSize=DefaultChunkSize, closeables=None,
+                 onDecodeError=None):
+        self._raw = rawStream
+        # Read whatever is available, up to chunkSize, if we can, so that we
+        # aren't waiting on a socket for a full chunk.
+        self._read = getattr(rawStream, 'read1', rawStream.read)
+        self.encoding = encoding
+        self._splitter = LineSplitter(encoding, onDecodeError)
+        self._empty = self._splitter.empty
+        self.chunkSize = chunkSize
+        self._closeables = closeables or []
+        self._lines = []
+        self._index = 0
+        self._eof = False
+
+    def readline(self):
+        if self._index >= len(self._lines):
+            if not self._fill():
+                return self._empty
+        line = self._lines[self._index]
+        self._index += 1
+        return line
+
+    # Generates the rest of the lines, a chunk at a time. If the generator is
+    # closed early, the lines it didn't get to are kept, so they can still be
+    # read.
+    def iterLines(self):
+        while True:
+            if self._index >= len(self._lines):
+                if not self._fill():
+                    return
+            lines = self._lines
+            start = self._index
+            self._index = len(lines)
+            remaining = iter(lines if start == 0 else lines[start:])
+            try:
+                yield from remaining
+            except GeneratorExit:
+                self._lines = list(remaining)
+                self._index = 0
+                raise
+
+    def __iter__(self):
+        return self.iterLines()
+
+    # Reads chunks until we have at least one line. Returns False at the end of
+    # the stream.
+    def _fill(self):
+        self._lines = []
+        self._index = 0
+        while not self._lines:
+            if self._eof:
+                return False
+            chunk = self._read(self.chunkSize)
+            if chunk:
+                self._lines = self._splitter.feed(chunk)
+            else:
+                self._eof = True
+                self._lines = self._splitter.finish()
+        return True
+
+    def close(self):
+        self._lines = []
+        self._index = 0
+        self._eof = True
+        for closeable in [self._raw] + self._closeables:
+            try:
+                closeable.close()
+            except (AttributeError, ValueError):
+                pass
+
+
+# Opens path as a ChunkedLineSource. If useMmap is True, the file is memory
+# mapped, and the chunks are read from the map, otherwise they are read from
+# the file.
+def openLineSource(path, encoding='utf-8',
+                   chunkSize=ChunkedLineSource.DefaultChunkSize, useMmap=False):
+    stream = open(path, 'rb')
+    if useMmap:
+        try:
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            mapped = None
+        if mapped is not None:
+            return ChunkedLineSource(mapped, encoding, chunkSize,
+                                     closeables=[stream])
+    return ChunkedLineSource(stream, encoding, chunkSize)
+
+
+# Decompresses data compressed with a Content-Encoding of gzip or deflate, a
+# piece at a time.
+class Decompressor(object):
+    def __init__(self, contentEncoding):
+        self.contentEncoding = contentEncoding.strip().lower()
+        if self.contentEncoding in ('gzip', 'x-gzip'):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.contentEncoding == 'deflate':
+            self._decompressor = zlib.decompressobj()
+        else:
+            raise ValueError('Unsupported encoding: %s' % contentEncoding)
+        # Some servers send raw deflate data without the zlib header, so we
+        # find out on the first piece.
+        self._sniffDeflate = self.contentEncoding == 'deflate'
+
+    def decompress(self, data):
+        if self._sniffDeflate:
+            self._sniffDeflate = False
+            try:
+                return self._decompressor.decompress(data)
+            except zlib.error:
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._decompressor.decompress(data)
+
+    def flush(self):
+        return self._decompressor.flush()
+
+
+# Decompresses a raw stream as it's read, for HTTP responses with a
+# Content-Encoding of gzip or deflate.
+class DecompressingReader(object):
+    def __init__(self, rawStream, contentEncoding):
+        self._raw = rawStream
+        self._read = getattr(rawStream, 'read1', rawStream.read)
+        self._decompressor = Decompressor(contentEncoding)
+        self.contentEncoding = self._decompressor.contentEncoding
+        self._eof = False
+
+    # Returns up to about size decompressed bytes. It may be more, since we
+    # don't limit the decompressor, but never empty until the end.
+    def read(self, size=-1):
+        while not self._eof:
+            data = self._read(size if size and size > 0 else 64 * 1024)
+            if not data:
+                self._eof = True
+                return self._decompressor.flush()
+            out = self._decompressor.decompress(data)
+            if out:
+                return out
+        return b''
+
+    def close(self):
+        self._raw.close()
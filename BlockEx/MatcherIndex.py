@@ -0,0 +1,69 @@
+from BlockEx.AhoCorasick import KeywordAutomaton
+from BlockEx.BlockBase import BlockBase
+from BlockEx.MatcherSet import isStockBlock
+
+
+# With more literals than this, finding them with an automaton is faster than
+# checking for each one.
+MaxScannedLiterals = 16
+
+
+# Finds the idle matchers (the ones that aren't current) that could do
+# something with a line, so the parser doesn't have to offer the line to all
+# of them.
+#
+# An idle BlockBase is waiting for its first opening regex. If that regex needs
+# a literal (see Prefilter) that isn't in the line, offering the line would
+# only reset the block again, so it's skipped. The matchers are bucketed by that
+# literal, and the literals found in the line pick the buckets. Matchers we
+# can't bucket (no opening regexes, no literal, or a subclass with its own line
+# handling) are always candidates.
+class MatcherIndex(object):
+    def __init__(self, matchers):
+        self.matchers = list(matchers)
+        always = []
+        buckets = {}
+        for position, matcher in enumerate(self.matchers):
+            literal = self._openingLiteral(matcher)
+            if literal is None:
+                always.append(position)
+            else:
+                buckets.setdefault(literal, []).append(position)
+        self._always = always
+        self._alwaysMatchers = [self.matchers[p] for p in always]
+        self._literals = list(buckets)
+        self._buckets = [buckets[literal] for literal in self._literals]
+        if len(self._literals) > MaxScannedLiterals:
+            self._automaton = KeywordAutomaton(self._literals)
+        else:
+            self._automaton = None
+
+    # The literal that the matcher's first opening regex needs, or None.
+    def _openingLiteral(self, matcher):
+        if not isStockBlock(matcher) or not matcher.openingRegexes:
+            return None
+        prefilter = matcher._table[0][BlockBase.TableFilter]
+        if prefilter is None:
+            return None
+        return prefilter.literals[0]
+
+    def _foundLiterals(self, line):
+        if self._automaton is not None:
+            return set(index for index, _, _
+                       in self._automaton.iterMatches(line))
+        return [index for index, literal in enumerate(self._literals)
+                if literal in line]
+
+    # Returns the matchers that could do something with the line, in the
+    # order they're in the parser. Any matcher that isn't returned would not
+    # match the line if it's idle.
+    def candidates(self, line):
+        found = self._foundLiterals(line)
+        if not found:
+            return self._alwaysMatchers
+        positions = list(self._always)
+        for index in found:
+            positions.extend(self._buckets[index])
+        positions.sort()
+        matchers = self.matchers
+        return [matchers[p] for p in positions]
@@ -0,0 +1,211 @@
+import re
+
+from BlockEx.BlockBase import BlockBase
+from BlockEx.BlockMatchex import BlockMatchex, FindAllMatchex
+
+
+# The inline flags that we can scope to a single alternative of the combined
+# pattern. Anything else (ASCII, LOCALE) can't be mixed with the other
+# patterns, so those matchers are always dispatched.
+_ScopedFlags = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'),
+                (re.DOTALL, 's'), (re.VERBOSE, 'x'))
+_ScopedMask = re.IGNORECASE | re.MULTILINE | re.DOTALL | re.VERBOSE
+
+# Backreferences by number or name break when the pattern is embedded in
+# another one, since the group numbers shift.
+_BackrefRegex = re.compile(r'\\[1-9]|\(\?P=')
+
+# Number of combined patterns we keep around before starting over.
+_MaxCachedStates = 64
+
+
+# Returns the (regex, searches) pair the BlockMatchex tests lines with, or None
+# if the matchex does something we can't express as a regex.
+def _matchexRegex(matchex):
+    cls = type(matchex)
+    if cls.testMatch is not BlockMatchex.testMatch:
+        return None
+    if getattr(matchex, 'blockRegex', None) is None:
+        return None
+    if cls._match is BlockMatchex._match:
+        return (matchex.blockRegex, False)
+    elif cls._match is FindAllMatchex._match:
+        return (matchex.blockRegex, True)
+    return None
+
+
+# True if the BlockBase subclass only uses the stock line handling, so we know
+# exactly which regex it is going to run in each state.
+def isStockBlock(block):
+    cls = type(block)
+    for name in ('getState', 'wantsLine', 'processLine', 'isFinished',
+                 '_processLine', 'reset'):
+        if getattr(cls, name) is not getattr(BlockBase, name):
+            return False
+    return True
+
+
+# Wraps the pattern of the compiled regex so that it can be an alternative in
+# a larger pattern with the same flags it was compiled with. Returns None if
+# that isn't possible.
+def _scopedPattern(regex, searches):
+    pattern = regex.pattern
+    if regex.groupindex or _BackrefRegex.search(
+            pattern if isinstance(pattern, str)
+            else pattern.decode('latin-1')):
+        return None
+    if regex.flags & ~(_ScopedMask | re.UNICODE):
+        return None
+    letters = ''.join(letter for flag, letter in _ScopedFlags
+                      if regex.flags & flag)
+    prefix = '(?s:.*?)' if searches else ''
+    scoped = '%s(?%s:' % (prefix, letters) if letters else '%s(?:' % prefix
+    if isinstance(pattern, bytes):
+        return scoped.encode('ascii') + pattern + b')'
+    return scoped + pattern + ')'
+
+
+# Builds one regex out of the regexes that every BlockBase would run against
+# the next line, so that a line is scanned once instead of once per matcher.
+# The result of the scan tells the parser which matchers need the line. The
+# rest would not have done anything with it, so the parser can skip them.
+#
+# The combined pattern depends on the state of each matcher (which opener it
+# is waiting for, or whether it's inside the block), so it is cached by those
+# states and rebuilt only when they change.
+class CompiledMatcherSet(object):
+    def __init__(self, matchers):
+        self.matchers = list(matchers)
+        self._cache = {}
+        self._stateKey = None
+        self._dispatched = []
+        self._stock = [isStockBlock(m) for m in self.matchers]
+        self.refresh()
+
+    def _currentStateKey(self):
+        return tuple(m._matchIndex for m in self.matchers)
+
+    # Recomputes the combined pattern if any matcher changed state.
+    def refresh(self):
+        key = self._currentStateKey()
+        if key == self._stateKey:
+            return
+        self._stateKey = key
+        compiled = self._cache.get(key)
+        if compiled is None:
+            if len(self._cache) >= _MaxCachedStates:
+                self._cache.clear()
+            compiled = self._build()
+            self._cache[key] = compiled
+        (self._anyRegex, self._allRegex, self._owners, self._volatile,
+         self._pendingFinish) = compiled
+
+    def _build(self):
+        pieces = []
+        owners = {}
+        volatile = []
+        pendingFinish = []
+        for index, matcher in enumerate(self.matchers):
+            regexes = self._regexesFor(index, matcher)
+            if regexes is None:
+                volatile.append(matcher)
+                continue
+            if matcher.endingRegex is None and \
+               matcher.getState() == BlockBase.InsideBlockState:
+                # With no ending regex, the block finishes on the line after
+                # the matchex matched, whatever that line is.
+                pendingFinish.append(matcher)
+            matcherPieces = []
+            for kind, regex, searches in regexes:
+                scoped = _scopedPattern(regex, searches)
+                if scoped is None:
+                    matcherPieces = None
+                    break
+                matcherPieces.append(('g%d%s' % (index, kind), scoped))
+            if matcherPieces is None:
+                volatile.append(matcher)
+                continue
+            for name, scoped in matcherPieces:
+                pieces.append((name, scoped))
+                owners[name] = matcher
+
+        anyRegex = None
+        allRegex = None
+        if pieces:
+            isBytes = isinstance(pieces[0][1], bytes)
+            if all(isinstance(p, bytes) == isBytes for _, p in pieces):
+                anyRegex, allRegex = self._compile(pieces, isBytes)
+            if anyRegex is None:
+                # Couldn't build it, so everything goes through the matchers
+                volatile = list(self.matchers)
+                owners = {}
+                pendingFinish = []
+        return (anyRegex, allRegex, owners, volatile, pendingFinish)
+
+    def _compile(self, pieces, isBytes):
+        if isBytes:
+            anyParts = [b'(?P<' + n.encode('ascii') + b'>' + p + b')'
+                        for n, p in pieces]
+            allParts = [b'(?:(?=(?P<' + n.encode('ascii') + b'>' + p + b')))?'
+                        for n, p in pieces]
+            joiner, empty = b'|', b''
+        else:
+            anyParts = ['(?P<%s>%s)' % (n, p) for n, p in pieces]
+            allParts = ['(?:(?=(?P<%s>%s)))?' % (n, p) for n, p in pieces]
+            joiner, empty = '|', ''
+        try:
+            return (re.compile(joiner.join(anyParts)),
+                    re.compile(empty.join(allParts)))
+        except (re.error, OverflowError, RecursionError) as err:
+            print('WARNING: Unable to combine matcher regexes: %s' % err)
+            return (None, None)
+
+    # The (kind, regex, searches) tuples the matcher runs in its current state,
+    # or None if it needs to see every line.
+    def _regexesFor(self, index, matcher):
+        if not self._stock[index]:
+            return None
+        state = matcher.getState()
+        if state == BlockBase.OpeningBlockState:
+            if matcher._matchIndex > 0:
+                # A partial opener sequence resets on a miss, so it always
+                # needs the line.
+                return None
+            return [('o', matcher.openingRegexes[0], False)]
+        elif state == BlockBase.InsideBlockState:
+            matchexRegex = _matchexRegex(matcher.blockMatchex)
+            if matchexRegex is None:
+                return None
+            regexes = [('b', matchexRegex[0], matchexRegex[1])]
+            if matcher.endingRegex is not None:
+                regexes.append(('e', matcher.endingRegex, False))
+            return regexes
+        return None
+
+    # Returns the set of matchers that have to process the line. Any matcher
+    # not in the set would not match, or change state, on this line.
+    def dispatch(self, line):
+        dispatched = set(self._volatile)
+        for matcher in self._pendingFinish:
+            if matcher.blockMatchex.matchFound:
+                dispatched.add(matcher)
+        if self._anyRegex is not None and \
+           self._anyRegex.match(line) is not None:
+            owners = self._owners
+            groups = self._allRegex.match(line).groupdict()
+            for name, value in groups.items():
+                if value is not None:
+                    dispatched.add(owners[name])
+        self._dispatched = [(m, m._matchIndex) for m in dispatched]
+        return dispatched
+
+    # Called after the dispatched matchers have processed the line. Only they
+    # can have changed state, so we only look at them.
+    def settle(self):
+        dispatched = self._dispatched
+        if dispatched:
+            self._dispatched = []
+            for matcher, matchIndex in dispatched:
+                if matcher._matchIndex != matchIndex:
+                    self.refresh()
+                    break
@@ -0,0 +1,95 @@
+from BlockEx.BlockBase import BlockBase
+from BlockEx.MatcherSet import isStockBlock
+
+
+# One opening regex in a sequence of them. Every matcher whose openers start
+# with the same regexes, up to and including this one, shares the node, so
+# the regex is only run once per line however many of them are waiting on it.
+# The ending regex of matchers with the same openers gets a node, too.
+class OpenerNode(object):
+    __slots__ = ('regex', 'prefilter', 'depth', 'children', 'matchers',
+                 'lookups', 'evaluations', '_line', '_match')
+
+    def __init__(self, regex, prefilter, depth):
+        self.regex = regex
+        self.prefilter = prefilter
+        self.depth = depth
+        self.children = {}
+        # The matchers that have this opener
+        self.matchers = []
+        # How many times the matchers asked, and how many times the regex
+        # actually ran.
+        self.lookups = 0
+        self.evaluations = 0
+        self._line = None
+        self._match = None
+
+    # Returns the match of the regex on line (or None). The result for the
+    # last line is kept, so the other matchers asking about the same line get
+    # it without running the regex again.
+    def match(self, line):
+        self.lookups += 1
+        if line is self._line:
+            return self._match
+        self.evaluations += 1
+        prefilter = self.prefilter
+        if prefilter is not None and prefilter.rejects(line):
+            match = None
+        else:
+            match = self.regex.match(line)
+        self._line = line
+        self._match = match
+        return match
+
+
+# Merges the opening regexes of the matchers into a trie, by their common
+# prefixes, and points each matcher at its nodes. The matchers go through the
+# nodes instead of running their opening (and ending) regexes themselves.
+# Their state, and the delegate callbacks, are still their own.
+class OpenerTrie(object):
+    def __init__(self, matchers):
+        self.roots = {}
+        self.nodes = []
+        self.matchers = []
+        for matcher in matchers:
+            if not isStockBlock(matcher) or not matcher.openingRegexes:
+                matcher.useOpeners(None)
+                continue
+            children = self.roots
+            nodes = []
+            for depth, regex in enumerate(matcher.openingRegexes):
+                node = children.get(regex)
+                if node is None:
+                    prefilter = matcher._table[depth][BlockBase.TableFilter]
+                    node = OpenerNode(regex, prefilter, depth)
+                    children[regex] = node
+                    self.nodes.append(node)
+                node.matchers.append(matcher)
+                nodes.append(node)
+                children = node.children
+            if matcher.endingRegex is not None:
+                depth = len(nodes)
+                key = ('ending', matcher.endingRegex)
+                node = children.get(key)
+                if node is None:
+                    prefilter = matcher._table[depth][BlockBase.TableFilter]
+                    node = OpenerNode(matcher.endingRegex, prefilter, depth)
+                    children[key] = node
+                    self.nodes.append(node)
+                node.matchers.append(matcher)
+                nodes.append(node)
+            matcher.useOpeners(tuple(nodes))
+            self.matchers.append(matcher)
+
+    # Lets the matchers run their own opening regexes again.
+    def release(self):
+        for matcher in self.matchers:
+            matcher.useOpeners(None)
+        self.matchers = []
+
+    # Returns the number of nodes, how many times the matchers looked up an
+    # opener, and how many times a regex actually ran.
+    def getStats(self):
+        return {'nodes': len(self.nodes),
+                'lookups': sum(node.lookups for node in self.nodes),
+                'evaluations': sum(node.evaluations for node in self.nodes)}
@@ -0,0 +1,304 @@
+from BlockEx.LineSource import ChunkedLineSource
+from BlockEx.MatcherSet import isStockBlock
+from BlockEx.Parser import FileStreamParser
+
+import collections
+import concurrent.futures
+import os
+import pickle
+import shutil
+import tempfile
+import traceback
+
+
+# A match in a file. groups is what the matchex had when _handleLine was
+# called (its groups, or matchStrings if it doesn't have groups).
+FileMatch = collections.namedtuple('FileMatch',
+                                   ['matcherIndex', 'lineNumber', 'groups'])
+
+# The result of parsing one file. newPath is the processed output, if the file
+# was processed, and error is the traceback if parsing failed.
+FileResult = collections.namedtuple('FileResult',
+                                    ['path', 'matches', 'newPath', 'error'])
+
+
+# Returns what the matchex found, in a form that we can send back from a
+# worker process.
+def matchGroups(matchex):
+    for name in ('groups', 'matchStrings'):
+        value = getattr(matchex, name, None)
+        if value is not None:
+            return list(value)
+    return None
+
+
+# Collects the matches instead of handing them to a subclass.
+class CollectingFileParser(FileStreamParser):
+    def __init__(self, path, process=False, **kwargs):
+        super(CollectingFileParser, self).__init__(path, process, **kwargs)
+        self.matches = []
+
+    def _prepareParse(self):
+        super(CollectingFileParser, self)._prepareParse()
+        self._matcherIndices = dict((id(matcher), index) for index, matcher
+                                    in enumerate(self.blockMatchers))
+
+    def _handleLine(self, matcher):
+        self.matches.append(FileMatch(self._matcherIndices[id(matcher)],
+                                      self.lineNumber,
+                                      matchGroups(matcher.blockMatchex)))
+        return False
+
+
+# Parses one file with the matchers, and returns the FileResult.
+def parseFile(path, matchers, process=False, isCooperative=True,
+              compileMatchers=False, **parserOptions):
+    parser = None
+    try:
+        for matcher in matchers:
+            matcher.reset()
+        parser = CollectingFileParser(path, process, **parserOptions)
+        parser.isCooperative = isCooperative
+        parser.compileMatchers = compileMatchers
+        parser.blockMatchers = matchers
+        parser.parse()
+        return FileResult(path, parser.matches,
+                          getattr(parser, 'newPath', None), None)
+    except Exception:
+        return FileResult(path, [], None, traceback.format_exc())
+
+
+# Runs in the worker processes. The matchers are made once for the chunk of
+# files, and reset between them.
+def _parseChunk(paths, matcherFactory, options):
+    matchers = matcherFactory()
+    return [parseFile(path, matchers, **options) for path in paths]
+
+
+# Parses every file in paths with the matchers from matcherFactory, in a pool
+# of worker processes, and generates a FileResult for each file as it's
+# finished. The results aren't in the order of paths.
+#
+# matcherFactory: returns a list of BlockBases. It's called in the workers,
+#   so it has to be picklable (a module level function or class).
+# process: if True, each file is written to path + '.new', like a processing
+#   FileStreamParser.
+# maxWorkers: the number of worker processes. Defaults to the number of CPUs.
+#   If 0, the files are parsed in this process.
+# filesPerChunk: the number of files sent to a worker at a time.
+# The rest of the arguments (isCooperative, compileMatchers, and chunkSize,
+# useMmap, and bytesMode for FileStreamParser) go to the parsers.
+def parseFiles(paths, matcherFactory, process=False, maxWorkers=None,
+               filesPerChunk=1, **options):
+    options['process'] = process
+    paths = list(paths)
+    chunks = [paths[i:i + filesPerChunk]
+              for i in range(0, len(paths), filesPerChunk)]
+    if maxWorkers == 0:
+        for chunk in chunks:
+            for result in _parseChunk(chunk, matcherFactory, options):
+                yield result
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(maxWorkers) as executor:
+        futures = [executor.submit(_parseChunk, chunk, matcherFactory, options)
+                   for chunk in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            for result in future.result():
+                yield result
+
+
+# Reads the bytes of the file from start up to end.
+class _RangeReader(object):
+    def __init__(self, path, start, end):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0:
+            size = self._remaining
+        data = self._file.read(min(size, self._remaining))
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+# Parses the lines between the byte offsets start and end of the file, and
+# writes the output (if outputPath is set) to outputPath instead of path.new.
+class _RangeParser(CollectingFileParser):
+    def __init__(self, path, start, end, outputPath, bytesMode=False,
+                 chunkSize=None, useMmap=False):
+        super(_RangeParser, self).__init__(path, False, bytesMode=bytesMode)
+        self.inputStream.close()
+        encoding = None if bytesMode else self.encoding
+        self.inputStream = ChunkedLineSource(
+            _RangeReader(path, start, end), encoding,
+            chunkSize or ChunkedLineSource.DefaultChunkSize)
+        if outputPath is not None:
+            if bytesMode:
+                self.outputStream = open(outputPath, "wb")
+            else:
+                self.outputStream = open(outputPath, "w")
+
+
+# Matchers can be sent to the workers as a factory, or pickled. Delegates stay
+# in this process, and so do the opener nodes the parser shared between them,
+# since the workers' parsers share their own.
+def _pickleMatchers(matchers):
+    delegates = [matcher.delegate for matcher in matchers]
+    openers = [matcher._openers for matcher in matchers]
+    try:
+        for matcher in matchers:
+            matcher.delegate = None
+            matcher.useOpeners(None)
+        return pickle.dumps(matchers)
+    finally:
+        for matcher, delegate, opener in zip(matchers, delegates, openers):
+            matcher.delegate = delegate
+            matcher.useOpeners(opener)
+
+
+def _makeMatchers(matcherSource):
+    if isinstance(matcherSource, bytes):
+        return pickle.loads(matcherSource)
+    return matcherSource()
+
+
+# Runs in the worker processes. Returns the matches (with line numbers
+# starting from the start of the range), and the number of lines.
+def _parseRange(path, start, end, outputPath, matcherSource, options):
+    options = dict(options)
+    isCooperative = options.pop('isCooperative', True)
+    compileMatchers = options.pop('compileMatchers', False)
+    parser = _RangeParser(path, start, end, outputPath, **options)
+    parser.isCooperative = isCooperative
+    parser.compileMatchers = compileMatchers
+    parser.blockMatchers = _makeMatchers(matcherSource)
+    parser.parse()
+    return parser.matches, parser.lineNumber + 1
+
+
+# True if every matcher is back at the start after the line, whatever state it
+# was in before: the line closes the block of every matcher, and doesn't open
+# a new one or match inside one.
+def isSafeSplit(line, matchers):
+    for matcher in matchers:
+        if not isStockBlock(matcher) or matcher.endingRegex is None:
+            return False
+        if matcher.endingRegex.match(line) is None:
+            return False
+        for regex in matcher.openingRegexes:
+            if regex.match(line) is not None:
+                return False
+        if matcher.blockMatchex.testMatch(line):
+            return False
+    return True
+
+
+# Returns the byte offsets that the file can be split at, so that it's split
+# into about numRanges ranges, starting with 0. We look for a split line
+# starting at each of the even splits. A split is after a line that
+# isSafeSplit, or before a line that matches resyncRegex (a line that no block
+# is open at).
+def findSplits(path, matchers, numRanges, resyncRegex=None, bytesMode=False,
+               encoding='utf-8'):
+    size = os.path.getsize(path)
+    splits = [0]
+    with open(path, 'rb') as stream:
+        for i in range(1, numRanges):
+            target = size * i // numRanges
+            limit = size * (i + 1) // numRanges
+            if target <= splits[-1]:
+                continue
+            # Skip the rest of the line the target is in.
+            stream.seek(target - 1)
+            stream.readline()
+            while stream.tell() < limit:
+                start = stream.tell()
+                raw = stream.readline()
+                if not raw:
+                    break
+                if bytesMode:
+                    line = raw
+                else:
+                    line = raw.decode(encoding, 'replace')
+                    if line.endswith('\r\n'):
+                        line = line[:-2] + '\n'
+                if resyncRegex is not None and \
+                   resyncRegex.match(line) is not None:
+                    split = start
+                elif isSafeSplit(line, matchers):
+                    split = stream.tell()
+                else:
+                    continue
+                if splits[-1] < split < size:
+                    splits.append(split)
+                break
+    return splits
+
+
+# Parses the file at path in parallel, by splitting it where no block can be
+# open (see findSplits) and parsing each range in a worker process. Returns
+# the FileMatches in the order of the file, with line numbers from the start
+# of the file. If newPath is set, the output of the ranges is put together
+# there, the same as a serial parse would have written it.
+#
+# matchers: a list of BlockBases (which are pickled), or a picklable factory
+#   for them.
+# options: isCooperative, compileMatchers, and bytesMode, chunkSize for the
+#   parsers.
+def parseFileParallel(path, matchers, newPath=None, maxWorkers=None,
+                      numRanges=None, resyncRegex=None, **options):
+    if callable(matchers):
+        matcherSource = matchers
+        checkMatchers = matchers()
+    else:
+        matcherSource = _pickleMatchers(matchers)
+        checkMatchers = _makeMatchers(matcherSource)
+    bytesMode = options.get('bytesMode', False)
+    if bytesMode:
+        for matcher in checkMatchers:
+            matcher.useBytes()
+    if numRanges is None:
+        numRanges = maxWorkers or os.cpu_count() or 1
+    splits = findSplits(path, checkMatchers, numRanges, resyncRegex,
+                        bytesMode)
+    size = os.path.getsize(path)
+    ranges = list(zip(splits, splits[1:] + [size]))
+
+    directory = None
+    outputPaths = [None] * len(ranges)
+    if newPath is not None:
+        directory = tempfile.mkdtemp(dir=os.path.dirname(newPath) or None)
+        outputPaths = [os.path.join(directory, 'range%d' % i)
+                       for i in range(len(ranges))]
+    try:
+        with concurrent.futures.ProcessPoolExecutor(maxWorkers) as executor:
+            futures = [executor.submit(_parseRange, path, start, end,
+                                       outputPath, matcherSource, options)
+                       for (start, end), outputPath
+                       in zip(ranges, outputPaths)]
+            results = [future.result() for future in futures]
+
+        matches = []
+        firstLine = 0
+        for rangeMatches, numLines in results:
+            for match in rangeMatches:
+                matches.append(match._replace(
+                    lineNumber=match.lineNumber + firstLine))
+            firstLine += numLines
+
+        if newPath is not None:
+            with open(newPath, 'wb') as output:
+                for outputPath in outputPaths:
+                    with open(outputPath, 'rb') as rangeOutput:
+                        shutil.copyfileobj(rangeOutput, output, 1024 * 1024)
+        return matches
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory)
@@ -0,0 +1,107 @@
+import time
+
+
+# What one matcher did during an instrumented parse. Tests are how many times
+# a regex was tried on a line (through the prefilters and shared openers, so
+# it may not actually have run), and hits how many of them matched, for each
+# state: opening, block (the matchex) and ending.
+class MatcherStats(object):
+    Counts = ('lines', 'openingTests', 'openingHits', 'blockTests',
+              'blockHits', 'endingTests', 'endingHits', 'opened', 'abandoned',
+              'completed')
+    Times = ('wantsLineSeconds', 'processLineSeconds', 'isFinishedSeconds')
+
+    __slots__ = ('index', 'name') + Counts + Times
+
+    def __init__(self, index, matcher):
+        self.index = index
+        self.name = type(matcher).__name__
+        for name in self.Counts:
+            setattr(self, name, 0)
+        for name in self.Times:
+            setattr(self, name, 0.0)
+
+    def asDict(self):
+        result = {'index': self.index, 'name': self.name}
+        for name in self.Counts + self.Times:
+            result[name] = getattr(self, name)
+        result['seconds'] = sum(getattr(self, name) for name in self.Times)
+        return result
+
+
+# The counts of an instrumented parse: the MatcherStats of each matcher, and
+# how long reading the lines took. readSeconds is all of the time spent
+# getting lines from the stream. If the stream reads in chunks (a
+# ChunkedLineSource), ioSeconds is the time spent reading them, and the rest is
+# decoding and splitting them into lines (decodeSeconds). Otherwise the two
+# can't be told apart, and they are None.
+class ParseStats(object):
+    def __init__(self, matchers):
+        self.matchers = dict((matcher, MatcherStats(index, matcher))
+                             for index, matcher in enumerate(matchers))
+        self.lines = 0
+        self.readSeconds = 0.0
+        self.ioSeconds = None
+        self.startTime = time.perf_counter()
+        self.endTime = None
+
+    # Times the raw reads of a ChunkedLineSource, so I/O can be told apart
+    # from decoding.
+    def timeReads(self, source):
+        read = getattr(source, '_read', None)
+        if read is None:
+            return
+        self.ioSeconds = 0.0
+        clock = time.perf_counter
+
+        def timedRead(size):
+            start = clock()
+            try:
+                return read(size)
+            finally:
+                self.ioSeconds += clock() - start
+        source._read = timedRead
+
+    # Generates the lines, timing how long each one took to get.
+    def timeLines(self, lines):
+        clock = time.perf_counter
+        iterator = iter(lines)
+        try:
+            while True:
+                start = clock()
+                try:
+                    line = next(iterator)
+                except StopIteration:
+                    self.readSeconds += clock() - start
+                    return
+                self.readSeconds += clock() - start
+                self.lines += 1
+                yield line
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    # Counts the blocks that were still opening, or open, when the parse
+    # ended.
+    def finish(self):
+        self.endTime = time.perf_counter()
+        for matcher, stats in self.matchers.items():
+            if matcher._matchIndex > 0:
+                stats.abandoned += 1
+
+    def snapshot(self):
+        endTime = self.endTime
+        if endTime is None:
+            endTime = time.perf_counter()
+        decodeSeconds = None
+        if self.ioSeconds is not None:
+            decodeSeconds = self.readSeconds - self.ioSeconds
+        matchers = sorted(self.matchers.values(),
+                          key=lambda stats: stats.index)
+        return {'lines': self.lines,
+                'seconds': endTime - self.startTime,
+                'readSeconds': self.readSeconds,
+                'ioSeconds': self.ioSeconds,
+                'decodeSeconds': decodeSeconds,
+                'matchers': [stats.asDict() for stats in matchers]}
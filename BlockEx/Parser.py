@@ -1,26 +1,123 @@
+from BlockEx.ConnectionPool import defaultPool
+from BlockEx.LineEdits import LineEdits
+from BlockEx.LineSource import ChunkedLineSource, DecompressingReader, \
+    openLineSource
+from BlockEx.MatcherIndex import MatcherIndex
+from BlockEx.MatcherSet import CompiledMatcherSet
+from BlockEx.OpenerTrie import OpenerTrie
+from BlockEx.ParseStats import ParseStats
+from BlockEx.Prefilter import prefilterStats
+from BlockEx.SpillFile import SpillFile
+
+import codecs
+import collections
 import http.client
+import re
+import shutil
+import time
 
-import ssl
 
+# A match, as iterMatches() generates it. matcher is the BlockBase,
+# lineNumber the number of the line (starting at 0), and groups and spans are
+# what its matchex's getMatchGroups() returned.
+MatchRecord = collections.namedtuple('MatchRecord',
+                                     ['matcher', 'lineNumber', 'groups',
+                                      'spans'])
 
+
+# Returns the charset from the value of a Content-Type header, or None if
+# there isn't one we know.
+def encodingFromContentType(contentType):
+    if contentType is None:
+        return None
+    ctParts = contentType.split(';')
+    if len(ctParts) == 2:
+        charTypeParts = ctParts[1].split('=')
+        if len(charTypeParts) == 2:
+            encoding = charTypeParts[1].strip().strip('"')
+            try:
+                codecs.lookup(encoding)
+                return encoding
+            except LookupError:
+                print('WARNING: Unknown encoding %s' % encoding)
+    return None
+
+
+# Keeps the lines of the stream, so they can be looked at again after they've
+# been parsed (by a BufferStreamParser, for example).
+#
+# By default, every line is kept. If maxLines is set, only the most recent
+# maxLines lines are kept in memory. Older lines are dropped, or, if
+# spillToDisk is True, written to a temporary file, where getLineAt() can still
+# find them. If keepOpenBlocks is True, the lines since the earliest block
+# that a parser has open are kept in memory too, even if there are more than
+# maxLines of them.
 class StreamContext(object):
-    def __init__(self):
+    def __init__(self, maxLines=None, spillToDisk=False, keepOpenBlocks=False):
+        self.maxLines = maxLines
+        self.spillToDisk = spillToDisk
+        self.keepOpenBlocks = keepOpenBlocks
+        self._spill = None
         self.contextReset()
 
     def contextReset(self):
-        self._lines = []
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        if self.maxLines is None:
+            self._lines = []
+        else:
+            self._lines = collections.deque()
+        # The number of the line at self._lines[0]
+        self._firstLine = 0
+        # Lines from this number on aren't dropped
+        self._pinnedLine = None
         # self._outputStream = open('webout',"w", encoding='utf-8')
 
     def bufferLine(self, line):
         self._lines.append(line)
         # self._outputStream.write(line)
+        if self.maxLines is not None and len(self._lines) > self.maxLines:
+            self._dropLines()
+
+    # Drops the oldest lines until we're down to maxLines, stopping at the
+    # pinned line.
+    def _dropLines(self):
+        lines = self._lines
+        numDrop = len(lines) - self.maxLines
+        if self._pinnedLine is not None:
+            numDrop = min(numDrop, self._pinnedLine - self._firstLine)
+        if numDrop <= 0:
+            return
+        if self.spillToDisk and self._spill is None:
+            self._spill = SpillFile(self._firstLine)
+        for _ in range(numDrop):
+            line = lines.popleft()
+            if self._spill is not None:
+                self._spill.append(line)
+        self._firstLine += numDrop
+
+    # Keeps lines from number on in memory, until unpinLines() is called.
+    def pinLine(self, number):
+        self._pinnedLine = number
+
+    def unpinLines(self):
+        self._pinnedLine = None
 
     def getCurrentLineNumber(self):
-        return len(self._lines) - 1
+        return self._firstLine + len(self._lines) - 1
+
+    # The number of lines that have been buffered, including any that have
+    # been dropped.
+    def getLineCount(self):
+        return self._firstLine + len(self._lines)
 
     def getLineAt(self, number):
-        if number < len(self._lines):
-            return self._lines[number]
+        index = number - self._firstLine
+        if 0 <= index < len(self._lines):
+            return self._lines[index]
+        elif index < 0 and self._spill is not None:
+            return self._spill.getLine(number)
         else:
             print('%s beyond index' % number)
             return None
@@ -38,29 +135,129 @@ class StreamParser(object):
     # line was handled and no more processing should be done
     BlockShouldExit = 2
 
+    # Why a parse stopped before the end of the stream (stopReason)
+    # _handleLine returned True, so a block returned BlockShouldExit
+    StopOnExit = 'exit'
+    # There were maxMatches matches
+    StopOnMaxMatches = 'maxMatches'
+    # Every matcher without an ending regex has matched (stopWhenAllFound)
+    StopOnAllFound = 'allFound'
+
     def __init__(self):
         self.blockMatchers = []
-        self.currentMatchers = []
+        # The matchers that are in (or opening) their blocks, in the order
+        # they got there. The dict is an ordered set, so adding, removing and
+        # finding a matcher doesn't depend on how many there are.
+        self.currentMatchers = {}
         self.isCooperative = True
+        # If True, the regexes of all the matchers are combined into one, so
+        # each line is only scanned once, and only handed to the matchers that
+        # would do something with it.
+        self.compileMatchers = False
+        self._matcherSet = None
+        # Finds the idle matchers that could do something with a line.
+        self._matcherIndex = None
+        # The opening regexes of the matchers, merged by their common
+        # prefixes, so that each one runs once per line.
+        self._openerTrie = None
+        # If True, lines are bytes and aren't decoded. The matchers are
+        # switched to bytes regexes, and only what they capture is decoded.
+        self.bytesMode = False
         self._errors = open('errors', "w", encoding='utf-8')
+        self.lineNumber = -1
+        # The MatchRecords that iterMatches() hasn't generated yet, while it's
+        # running.
+        self._pendingMatches = None
+        # What the matchers changed the line being parsed to, if they did.
+        self._editedLine = None
+        # If set (to a LineEdits), the changed lines are recorded in it,
+        # instead of every line being written to outputStream.
+        self.edits = None
+        # If True, parse() counts what each matcher does, and how long it
+        # takes, for stats(). It costs nothing when it's off, since the
+        # counting is done by swapping in _instrumentedProcessBlock.
+        self.instrument = False
+        self._stats = None
+        # When to stop parsing before the end of the stream. When we stop,
+        # the input is closed without reading the rest (for HTTP, the
+        # connection is dropped), and stopReason says why. Processing parsers
+        # copy the rest of the input to the output as it is.
+        # stopOnExit: stop once a block returns BlockShouldExit.
+        # maxMatches: if set, stop after this many matches (of all the
+        #   matchers).
+        # stopWhenAllFound: stop once every matcher without an ending regex
+        #   has matched.
+        self.stopOnExit = True
+        self.maxMatches = None
+        self.stopWhenAllFound = False
+        self.stopReason = None
+        self.matchCount = 0
+        # The matchers without an ending regex that haven't matched yet, if
+        # we stop when they all have.
+        self._unfound = None
+        self._stopsOnMatch = False
         self.reset()
 
     def reset(self):
         for matcher in self.blockMatchers:
             matcher.reset()
-        self.currentMatchers = []
+        self.currentMatchers = {}
         self.encoding = 'utf-8'
         self.inputStream = None
         self.outputStream = None
         self.status = 0
         self.reason = None
         self.forceConnectionClose = False
+        self.stopReason = None
 
     def completeParsing(self):
-        self._completeParsing()
-        if isinstance(self, StreamContext):
+        # Read the last of the stream before the subclass closes it, unless
+        # we stopped early, and won't read any more of it.
+        if self.stopReason is not None:
+            self.forceConnectionClose = True
+        elif isinstance(self, StreamContext):
             self.bufferLine(self._getNextLine())
+        self._completeParsing()
         self._errors.close()
+        for matcher in self.blockMatchers:
+            if matcher._matchIndex > 0 and matcher.delegate is not None:
+                matcher._notifyDelegate('onBlockAbandoned')
+        if self._stats is not None:
+            self._stats.finish()
+
+    # Adds up the literal prefilter counts of all the matchers. hitRate is the
+    # fraction of regex evaluations that the prefilters skipped.
+    # Matchers with the same regexes share their prefilters, so each is only
+    # counted once.
+    def getPrefilterStats(self):
+        prefilters = {}
+        for matcher in self.blockMatchers:
+            for prefilter in matcher.getPrefilters():
+                prefilters[id(prefilter)] = prefilter
+        return prefilterStats(prefilters.values())
+
+    # Returns how many opener nodes the matchers share, how many times they
+    # looked one up, and how many times a regex actually ran. See OpenerTrie.
+    def getOpenerStats(self):
+        if self._openerTrie is None:
+            return {'nodes': 0, 'lookups': 0, 'evaluations': 0}
+        return self._openerTrie.getStats()
+
+    # Returns what the matchers did in the last instrumented parse (see
+    # instrument), or None if it wasn't instrumented. This can be called during
+    # the parse, too. For each matcher, in blockMatchers order:
+    # o the lines it was offered (lines), and how many times each of its
+    #   regexes was tried and matched (openingTests, openingHits, blockTests,
+    #   blockHits, endingTests, endingHits)
+    # o the time spent in wantsLine, processLine and isFinished
+    # o the blocks it opened, abandoned (stopped opening part way, or still
+    #   open at the end) and completed
+    # And for the parse, the lines read, and the time spent reading them. See
+    # ParseStats.
+    def stats(self):
+        if self._stats is None:
+            return None
+        return self._stats.snapshot()
 
     # Subclasses implement this function. This gets called when the BlockBase
     # "wants" the line, not just on a match. _handleLine can know if it is
@@ -76,7 +273,7 @@ class StreamParser(object):
         # if line is a byte-type, we need to convert it to unicode. I believe
         # readline was returning bytes (Python 2.x?), but if it returns
         # a string, we don't need convert again.
-        if isinstance(line, str):
+        if isinstance(line, str) or self.bytesMode:
             return line
         else:
             ret = ''
@@ -87,6 +284,13 @@ class StreamParser(object):
                 self._errors.write('%s [%s]' % (uniErr, line))
             return ret
 
+    # Called by the line sources that decode chunks when a chunk can't be
+    # decoded.
+    def _onDecodeError(self, uniErr, chunk):
+        print('UnicodeDecodeError: %s' % uniErr)
+        self._errors.write('%s [%s]' %
+                           (uniErr, uniErr.object[uniErr.start:uniErr.end]))
+
     # line: the line in the stream to process
     # block: the BlockBase.
     def _processBlock(self, line, block):
@@ -98,76 +302,444 @@ class StreamParser(object):
             handled = self.BlockHandled
             if currentState == block.InsideBlockState:
                 didMatch, updated = block.processLine(line)
+                if updated is not line and updated != line:
+                    self._editedLine = updated
                 if didMatch:
+                    if self._pendingMatches is not None:
+                        groups, spans = block.blockMatchex.getMatchGroups()
+                        self._pendingMatches.append(
+                            MatchRecord(block, self.lineNumber, groups, spans))
+                    self.matchCount += 1
+                    if self._stopsOnMatch:
+                        self._checkStop(block)
                     if self._handleLine(block):
                         handled = self.BlockShouldExit
+                        if self.stopOnExit:
+                            self.stopReason = self.StopOnExit
                 # If we didn't match, we may have hit the end of the block. So
                 # check to see if we match the closing expression. If
                 # successful, isFinished will call reset on the block.
                 if not didMatch and block.isFinished(line):
                     handled = self.BlockNotHandled
+                    if block._completedLine is not None:
+                        self._editedLine = block._completedLine
 
         return handled
 
-    def parse(self):
-        lineData = self._getNextLine()
-        while lineData:
-            if isinstance(self, StreamContext):
-                self.bufferLine(lineData)
+    # _processBlock, counting what the block does and timing its calls, for
+    # instrumented parses. It's swapped in for _processBlock, so the two must
+    # stay in step.
+    def _instrumentedProcessBlock(self, line, block):
+        stats = self._stats.matchers[block]
+        clock = time.perf_counter
+        stats.lines += 1
+        handled = self.BlockNotHandled
+        currentState = block.getState()
+        index = block._matchIndex
+        start = clock()
+        wanted = block.wantsLine(line)
+        stats.wantsLineSeconds += clock() - start
+        if currentState != block.InsideBlockState:
+            stats.openingTests += 1
+            if wanted:
+                stats.openingHits += 1
+                if block.getState() == block.InsideBlockState:
+                    stats.opened += 1
+            elif index > 0:
+                stats.abandoned += 1
+        if wanted:
+            handled = self.BlockHandled
+            if currentState == block.InsideBlockState:
+                stats.blockTests += 1
+                start = clock()
+                didMatch, updated = block.processLine(line)
+                stats.processLineSeconds += clock() - start
+                if updated is not line and updated != line:
+                    self._editedLine = updated
+                if didMatch:
+                    stats.blockHits += 1
+                    if self._pendingMatches is not None:
+                        groups, spans = block.blockMatchex.getMatchGroups()
+                        self._pendingMatches.append(
+                            MatchRecord(block, self.lineNumber, groups, spans))
+                    self.matchCount += 1
+                    if self._stopsOnMatch:
+                        self._checkStop(block)
+                    if self._handleLine(block):
+                        handled = self.BlockShouldExit
+                        if self.stopOnExit:
+                            self.stopReason = self.StopOnExit
+                if not didMatch:
+                    if block.endingRegex is not None:
+                        stats.endingTests += 1
+                    start = clock()
+                    finished = block.isFinished(line)
+                    stats.isFinishedSeconds += clock() - start
+                    if finished:
+                        if block.endingRegex is not None:
+                            stats.endingHits += 1
+                        stats.completed += 1
+                        handled = self.BlockNotHandled
+                        if block._completedLine is not None:
+                            self._editedLine = block._completedLine
 
-            handled = self.BlockNotHandled
-            currentMatchers = self.currentMatchers.copy()
-            for currentMatcher in currentMatchers:
-                handled = self._processBlock(lineData, currentMatcher)
-                if handled == self.BlockNotHandled:
-                    self.currentMatchers.remove(currentMatcher)
+        return handled
 
-            if handled == self.BlockNotHandled or not self.isCooperative:
-                for block in self.blockMatchers:
-                    if block not in self.currentMatchers:
-                        handled = self._processBlock(lineData, block)
-                        if handled == self.BlockHandled:
-                            self.currentMatchers.append(block)
-                            if not self.isCooperative:
-                                break
+    # Called on each match, if we stop after enough of them.
+    def _checkStop(self, block):
+        if self.maxMatches is not None and \
+           self.matchCount >= self.maxMatches:
+            self.stopReason = self.StopOnMaxMatches
+        unfound = self._unfound
+        if unfound:
+            unfound.discard(block)
+            if not unfound:
+                self.stopReason = self.StopOnAllFound
+
+    # Called before the first line is read, once the matchers are set.
+    def _prepareParse(self):
+        # If we're a bounded StreamContext that keeps open blocks, we need to
+        # keep track of where they opened.
+        self._pinsOpenBlocks = isinstance(self, StreamContext) and \
+            self.keepOpenBlocks and self.maxLines is not None
+        self._openedAt = {}
+        # The number (starting at 0) of the line being parsed.
+        self.lineNumber = -1
+        self.stopReason = None
+        self.matchCount = 0
+        self._unfound = None
+        if self.stopWhenAllFound:
+            unfound = set(matcher for matcher in self.blockMatchers
+                          if matcher.endingRegex is None)
+            if unfound:
+                self._unfound = unfound
+        self._stopsOnMatch = self.maxMatches is not None or \
+            self._unfound is not None
+        if self.bytesMode:
+            for matcher in self.blockMatchers:
+                matcher.useBytes(self.encoding)
+        if self._openerTrie is not None:
+            self._openerTrie.release()
+        self._openerTrie = OpenerTrie(self.blockMatchers)
+        if self.compileMatchers:
+            self._matcherSet = CompiledMatcherSet(self.blockMatchers)
+        else:
+            self._matcherSet = None
+        # If _processBlock is overridden, it may want to see every line, so
+        # every matcher gets every line.
+        if type(self)._processBlock is StreamParser._processBlock:
+            self._matcherIndex = MatcherIndex(self.blockMatchers)
+        else:
+            self._matcherIndex = None
+        self.__dict__.pop('_processBlock', None)
+        if not self.instrument:
+            self._stats = None
+        else:
+            self._stats = ParseStats(self.blockMatchers)
+            self._stats.timeReads(self.inputStream)
+            if type(self)._processBlock is StreamParser._processBlock:
+                self._processBlock = self._instrumentedProcessBlock
+            else:
+                print('WARNING: %s overrides _processBlock, so only the '
+                      'lines are counted' % type(self).__name__)
+
+    # Runs the matchers over lineData, the same way for every line in the
+    # stream.
+    def _parseLine(self, lineData):
+        self.lineNumber += 1
+        if isinstance(self, StreamContext):
+            self.bufferLine(lineData)
 
-            if self.outputStream is not None:
-                self.outputStream.write(lineData)
+        if self._matcherSet is not None:
+            self._dispatchCompiled(lineData)
+        else:
+            self._dispatchLine(lineData)
+
+        if self._pinsOpenBlocks:
+            self._pinOpenBlocks()
+
+        # If more than one matcher changed the line, the last one wins.
+        edited = self._editedLine
+        if edited is not None:
+            self._editedLine = None
+            lineData = edited
+            if self.edits is not None:
+                self.edits.record(self.lineNumber, edited)
+        if self.outputStream is not None:
+            self.outputStream.write(lineData)
+
+    # Pins the line where the earliest open block opened, so the StreamContext
+    # keeps every line of the open blocks.
+    def _pinOpenBlocks(self):
+        openedAt = self._openedAt
+        for matcher in self.currentMatchers:
+            if matcher._matchIndex > 0 and matcher not in openedAt:
+                openedAt[matcher] = self.getCurrentLineNumber()
+        for matcher in list(openedAt):
+            if matcher._matchIndex == 0:
+                del openedAt[matcher]
+        if openedAt:
+            self.pinLine(min(openedAt.values()))
+        else:
+            self.unpinLines()
+
+    # The idle matchers to offer the line to, in order. Without an index,
+    # that's all of them.
+    def _idleCandidates(self, lineData):
+        if self._matcherIndex is None:
+            return self.blockMatchers
+        return self._matcherIndex.candidates(lineData)
+
+    def _dispatchLine(self, lineData):
+        handled = self.BlockNotHandled
+        currentMatchers = self.currentMatchers
+        for currentMatcher in list(currentMatchers):
+            handled = self._processBlock(lineData, currentMatcher)
+            if handled == self.BlockNotHandled:
+                del currentMatchers[currentMatcher]
+
+        if handled == self.BlockNotHandled or not self.isCooperative:
+            for block in self._idleCandidates(lineData):
+                if block not in currentMatchers:
+                    handled = self._processBlock(lineData, block)
+                    if handled == self.BlockHandled:
+                        currentMatchers[block] = None
+                        if not self.isCooperative:
+                            break
+
+    # What _processBlock would have returned for a matcher that the compiled
+    # matcher set didn't dispatch the line to. It's either waiting for its
+    # first opener (and missed it), or inside the block, wanting lines.
+    def _undispatchedResult(self, block):
+        if block.getState() == block.InsideBlockState:
+            return self.BlockHandled
+        return self.BlockNotHandled
+
+    # Same as _dispatchLine, but only the matchers that the compiled matcher
+    # set picked out get to process the line.
+    def _dispatchCompiled(self, lineData):
+        dispatched = self._matcherSet.dispatch(lineData)
+        handled = self.BlockNotHandled
+        currentMatchers = self.currentMatchers
+        for currentMatcher in list(currentMatchers):
+            if currentMatcher in dispatched:
+                handled = self._processBlock(lineData, currentMatcher)
+            else:
+                handled = self._undispatchedResult(currentMatcher)
+            if handled == self.BlockNotHandled:
+                del currentMatchers[currentMatcher]
+
+        if handled == self.BlockNotHandled or not self.isCooperative:
+            for block in self._idleCandidates(lineData):
+                if block not in currentMatchers:
+                    if block in dispatched:
+                        handled = self._processBlock(lineData, block)
+                    else:
+                        handled = self._undispatchedResult(block)
+                    if handled == self.BlockHandled:
+                        currentMatchers[block] = None
+                        if not self.isCooperative:
+                            break
+        self._matcherSet.settle()
+
+    # Generates the lines of the stream. If the input stream can hand out its
+    # lines in bulk, and _getNextLine hasn't been overridden, we take them
+    # straight from the stream. Otherwise, it's one _getNextLine() at a time.
+    def _iterLines(self):
+        iterLines = getattr(self.inputStream, 'iterLines', None)
+        if iterLines is not None and \
+           type(self)._getNextLine is StreamParser._getNextLine:
+            lines = iterLines()
+        else:
+            lines = self._readLines()
+        if self._stats is not None:
+            return self._stats.timeLines(lines)
+        return lines
+
+    # Stops generating lines, when we stop early, so that the line source
+    # keeps the ones we didn't get to.
+    def _closeLines(self, lines):
+        close = getattr(lines, 'close', None)
+        if close is not None:
+            close()
+
+    def _readLines(self):
+        lineData = self._getNextLine()
+        while lineData:
+            yield lineData
             lineData = self._getNextLine()
 
+    def parse(self):
+        self._prepareParse()
+        lines = self._iterLines()
+        for lineData in lines:
+            self._parseLine(lineData)
+            if self.stopReason is not None:
+                self._closeLines(lines)
+                break
+
         self.completeParsing()
 
+    # Parses the stream like parse(), generating a MatchRecord for each match
+    # as the lines are read, so there's no need to subclass for _handleLine
+    # (it's still called). If we're closed before the end, the parse is
+    # completed without reading the rest of the stream.
+    def iterMatches(self):
+        pending = []
+        self._pendingMatches = pending
+        self._prepareParse()
+        try:
+            lines = self._iterLines()
+            for lineData in lines:
+                self._parseLine(lineData)
+                if pending:
+                    records = pending[:]
+                    del pending[:]
+                    yield from records
+                if self.stopReason is not None:
+                    self._closeLines(lines)
+                    break
+        except GeneratorExit:
+            self.forceConnectionClose = True
+            raise
+        finally:
+            self._pendingMatches = None
+            self.completeParsing()
+
 
 class FileStreamParser(StreamParser):
-    def __init__(self, path, process=True):
+    # The lines are written out in writes of about this many bytes.
+    OutputBufferSize = 1024 * 1024
+
+    # chunkSize: if set, the file is read in chunks of this many bytes, and
+    #   split into lines in bulk, instead of line by line.
+    # useMmap: if True, the file is memory mapped, and the chunks are split
+    #   from the map.
+    # bytesMode: if True, the lines are read, matched and written as bytes.
+    # editsOnly: if True (and processing), only the lines the matchers changed
+    #   are kept while parsing. The output is written when we're done, copying
+    #   the rest from the file in bulk, and if nothing changed, no output file
+    #   is created. See LineEdits.
+    # inPlace: if True, processing replaces the file itself (atomically),
+    #   instead of writing path + ".new". Implies editsOnly.
+    def __init__(self, path, process=True, chunkSize=None, useMmap=False,
+                 bytesMode=False, editsOnly=False, inPlace=False):
         super(FileStreamParser, self).__init__()
         self.path = path
-        self.inputStream = open(self.path, "r", encoding='utf-8')
+        self.bytesMode = bytesMode
+        encoding = None if bytesMode else self.encoding
+        if chunkSize is not None or useMmap:
+            if chunkSize is None:
+                chunkSize = ChunkedLineSource.DefaultChunkSize
+            self.inputStream = openLineSource(self.path, encoding,
+                                              chunkSize, useMmap)
+        elif bytesMode:
+            self.inputStream = open(self.path, "rb")
+        else:
+            self.inputStream = open(self.path, "r", encoding='utf-8')
+        self.inPlace = process and inPlace
+        # True once the output has been written, if it's only written when
+        # something changed.
+        self.wroteOutput = False
+        self.newPath = None
         if process:
-            self.newPath = path + ".new"
-            self.outputStream = open(self.newPath, "w")
+            self.newPath = path if self.inPlace else path + ".new"
+            if editsOnly or inPlace:
+                self.edits = LineEdits(bytesMode, self.encoding)
+            elif bytesMode:
+                self.outputStream = open(self.newPath, "wb",
+                                         buffering=self.OutputBufferSize)
+            else:
+                self.outputStream = open(self.newPath, "w",
+                                         buffering=self.OutputBufferSize)
 
     def _completeParsing(self):
+        if self.stopReason is not None and self.outputStream:
+            self._copyRest()
         self.inputStream.close()
         if self.outputStream:
             self.outputStream.close()
+        if self.edits is not None:
+            self.wroteOutput = self.edits.apply(self.path, self.newPath,
+                                                self.inPlace)
+
+    # Copies what we haven't read of the file to the output as it is, when we
+    # stopped early. (With editsOnly, the rest is copied anyway.)
+    def _copyRest(self):
+        iterLines = getattr(self.inputStream, 'iterLines', None)
+        if iterLines is not None:
+            self.outputStream.writelines(iterLines())
+        else:
+            shutil.copyfileobj(self.inputStream, self.outputStream,
+                               self.OutputBufferSize)
+
+    # Parses the file in worker processes, splitting it where no block can be
+    # open (after a line that closes every matcher's block, or before a line
+    # that matches resyncRegex). The output, if we're processing, is the same
+    # as parse() writes. _handleLine runs in the workers, so the matches are
+    # returned instead, as BlockEx.Parallel.FileMatches, in file order.
+    #
+    # matcherFactory: a picklable function that returns the matchers. If None,
+    #   blockMatchers is pickled and sent to the workers.
+    def parseParallel(self, matcherFactory=None, maxWorkers=None,
+                      resyncRegex=None, numRanges=None):
+        # Parallel imports us
+        from BlockEx.Parallel import parseFileParallel
+
+        self.inputStream.close()
+        if self.outputStream:
+            self.outputStream.close()
+        newPath = self.newPath if self.outputStream else None
+        if self.edits is not None:
+            print('WARNING: parseParallel writes every line to %s.new' %
+                  self.path)
+            newPath = self.path + ".new"
+        if isinstance(resyncRegex, (str, bytes)):
+            resyncRegex = re.compile(resyncRegex)
+        matches = parseFileParallel(
+            self.path, matcherFactory or self.blockMatchers,
+            newPath=newPath,
+            maxWorkers=maxWorkers, numRanges=numRanges,
+            resyncRegex=resyncRegex, isCooperative=self.isCooperative,
+            compileMatchers=self.compileMatchers, bytesMode=self.bytesMode)
+        self._errors.close()
+        return matches
 
 
 class UrlStreamParser(StreamParser, StreamContext):
-    def __init__(self, host, isSecure=False):
+    DefaultMaxDrainBytes = 256 * 1024
+
+    # bytesMode: if True, the body isn't decoded. Lines are matched as bytes,
+    #   and captured groups are decoded with the encoding from the response.
+    # acceptCompressed: if True, we ask for gzip or deflate compressed
+    #   responses, and decompress them as they're read.
+    # chunkSize: how much of the response to read at a time.
+    # maxLines, spillToDisk, keepOpenBlocks: bound the lines we keep as a
+    #   StreamContext. See StreamContext.
+    # pool: the ConnectionPool to get connections from. Parsers share the
+    #   default pool, so connections are reused across parsers, too.
+    # maxDrainBytes: when we're done parsing, we read what's left of the body
+    #   so the connection can be reused, unless there is more than this. Then
+    #   it's cheaper to drop the connection and open a new one.
+    def __init__(self, host, isSecure=False, bytesMode=False,
+                 acceptCompressed=False,
+                 chunkSize=ChunkedLineSource.DefaultChunkSize,
+                 maxLines=None, spillToDisk=False, keepOpenBlocks=False,
+                 pool=None, maxDrainBytes=DefaultMaxDrainBytes):
         # Multiple base classes, so we need to call both init's explicitly
         # super(UrlStreamParser, self).__init__()
         StreamParser.__init__(self)
-        StreamContext.__init__(self)
+        StreamContext.__init__(self, maxLines, spillToDisk, keepOpenBlocks)
+        self.bytesMode = bytesMode
+        self.acceptCompressed = acceptCompressed
+        self.chunkSize = chunkSize
+        self.response = None
         self.host = host
         self.isSecure = isSecure
-        # default type. What we use if we can't get it from the HTTP headers
-        if isSecure:
-            context = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-            context.verify_mode = ssl.CERT_NONE
-            self.client = http.client.HTTPSConnection(host, context=context)
-        else:
-            self.client = http.client.HTTPConnection(host)
+        self.pool = pool if pool is not None else defaultPool()
+        self.maxDrainBytes = maxDrainBytes
+        # Connected on setPath()
+        self.client = None
         self.isValid = False
 
     # Sets the URL path for the parse() function. We've set the host in the
@@ -177,55 +749,123 @@ class UrlStreamParser(StreamParser, StreamContext):
     # Be sure to check the return code for this. The URL may not be valid, or
     # it may have moved
     def setPath(self, path):
+        # In case the last path wasn't parsed
+        self._releaseClient()
         self.reset()
         # Since we're a StreamContext
         self.contextReset()
+        headers = {}
+        if self.acceptCompressed:
+            headers['Accept-Encoding'] = 'gzip, deflate'
+        resp = None
         try:
-            self.client.request('GET', path)
-        except ConnectionRefusedError:
+            resp = self._request(path, headers)
+        except ConnectionRefusedError as error:
             extra = ''
             if self.isSecure:
                 extra = '(over SSL)'
             print('Failed to connect to %s %s' % (self.host, extra))
-        resp = None
-        try:
-            resp = self.client.getresponse()
+            self._releaseClient()
+            return (error, None)
         except http.client.ResponseNotReady as error:
-            if resp is not None:
-                resp.read()
             # Some errors aren't entirely ERROR-worthy
             print('ERROR: Response not ready for %s: %s' % (path, error))
+            self._releaseClient()
             return (error, None)
 
         self.status = resp.status
         self.reason = resp.reason
+        self.response = resp
         if self.status != 200:
+            # Read the rest of the body, so the connection can be reused
+            self._releaseClient()
             if self.status == 301 or self.status == 302:
-                # Read the rest of the body
-                resp.read()
                 return (self.status, resp.getheader('Location', None))
             else:
                 return (self.status, resp.reason)
 
         # Get the encoding
-        contentType = resp.getheader('Content-Type')
-        if contentType is not None:
-            ctParts = contentType.split(';')
-            if len(ctParts) == 2:
-                charTypeParts = ctParts[1].split('=')
-                if len(charTypeParts) == 2:
-                    encoding = charTypeParts[1]
-                    self.encoding = encoding
+        encoding = encodingFromContentType(resp.getheader('Content-Type'))
+        if encoding is not None:
+            self.encoding = encoding
 
         if resp is not None:
             self.isValid = True
-        self.inputStream = resp
+        self.inputStream = self._openResponse(resp)
         return (self.status, None)
 
+    # Sends the request on a connection from the pool, and returns the
+    # response. If a reused connection was closed by the server while it was
+    # idle, we try once more on a new one.
+    def _request(self, path, headers):
+        while True:
+            self.client, isReused = self.pool.acquire(self.host, self.isSecure)
+            try:
+                self.client.request('GET', path, headers=headers)
+                return self.client.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError):
+                self.pool.discard(self.client)
+                self.client = None
+                if not isReused:
+                    raise
+
+    # Done with the response. If it's all been read, or the rest is small
+    # enough to read, the connection goes back to the pool. Otherwise, (or if
+    # forceConnectionClose is set) we drop the connection instead of reading
+    # the rest.
+    def _releaseClient(self):
+        client = self.client
+        resp = self.response
+        self.client = None
+        self.response = None
+        if client is None:
+            return
+        if resp is not None and not self._drainResponse(resp):
+            resp.close()
+            self.pool.discard(client)
+        else:
+            self.pool.release(self.host, self.isSecure, client)
+
+    # Reads what's left of the response, if there isn't too much of it.
+    # Returns True if it was all read, and the connection can be reused.
+    def _drainResponse(self, resp):
+        if self.forceConnectionClose or resp.will_close:
+            return False
+        if resp.length is not None and resp.length > self.maxDrainBytes:
+            return False
+        remaining = self.maxDrainBytes
+        try:
+            while not resp.isclosed():
+                if remaining < 0:
+                    return False
+                data = resp.read(min(remaining + 1, 64 * 1024))
+                if not data:
+                    break
+                remaining -= len(data)
+        except (http.client.HTTPException, OSError):
+            return False
+        return resp.isclosed()
+
+    # Wraps the response so that it's read in large chunks, decompressed if
+    # the server compressed it, and decoded incrementally, so characters that
+    # are split between reads are still decoded.
+    def _openResponse(self, resp):
+        raw = resp
+        contentEncoding = resp.getheader('Content-Encoding')
+        if contentEncoding is not None and \
+           contentEncoding.strip().lower() not in ('', 'identity'):
+            try:
+                raw = DecompressingReader(resp, contentEncoding)
+            except ValueError as error:
+                print('WARNING: %s. Reading the body as is.' % error)
+        encoding = None if self.bytesMode else self.encoding
+        return ChunkedLineSource(raw, encoding, self.chunkSize,
+                                 onDecodeError=self._onDecodeError)
+
     def _completeParsing(self):
-        # Read the rest of the data
-        if not self.forceConnectionClose:
-            self.inputStream.read()
+        # Reuse the connection if we can, before the input closes the response
+        self._releaseClient()
         self.inputStream.close()
         self.closeContext()
 
@@ -243,8 +883,10 @@ class BufferStreamParser(StreamParser):
     # (whether or not we're successful)  at endLine.
     def __init__(self, streamContext, startLine, endLine=None):
         super(BufferStreamParser, self).__init__()
+        # If the context was buffering bytes, we parse bytes.
+        self.bytesMode = getattr(streamContext, 'bytesMode', False)
         self._currentLineNumber = startLine
-        self._lines = streamContext._lines
+        self._context = streamContext
         self._endLine = endLine
 
     def _completeParsing(self):
@@ -254,8 +896,8 @@ class BufferStreamParser(StreamParser):
     def _getNextLine(self):
         if self._endLine is None or \
            self._currentLineNumber <= self._endLine:
-            if self._currentLineNumber < len(self._lines):
-                line = self._lines[self._currentLineNumber]
+            if self._currentLineNumber < self._context.getLineCount():
+                line = self._context.getLineAt(self._currentLineNumber)
                 self._currentLineNumber += 1
                 return line
         return None
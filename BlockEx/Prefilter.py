@@ -0,0 +1,134 @@
+import re
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+
+# Literals shorter than this are too common to be worth checking.
+MinLiteralLength = 2
+# We only check the longest few literals. The rest are unlikely to reject a
+# line that the longer ones didn't.
+MaxLiterals = 3
+
+_RepeatOps = tuple(getattr(sre_constants, name)
+                   for name in ('MAX_REPEAT', 'MIN_REPEAT',
+                                'POSSESSIVE_REPEAT')
+                   if hasattr(sre_constants, name))
+
+
+def _parsedFlags(parsed):
+    state = getattr(parsed, 'state', None)
+    if state is None:
+        state = getattr(parsed, 'pattern', None)
+    return getattr(state, 'flags', 0)
+
+
+# Walks the parsed regex, appending every run of literal characters that any
+# match has to contain to literals.
+def _collectLiterals(items, literals):
+    run = []
+
+    def flush():
+        if run:
+            literals.append(list(run))
+            del run[:]
+
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            run.append(av)
+        elif op == sre_constants.AT:
+            # Zero width, so the literals on each side are still adjacent.
+            continue
+        elif op == sre_constants.SUBPATTERN:
+            flush()
+            # (group, add_flags, del_flags, pattern) or (group, pattern)
+            if len(av) == 4 and av[1] & re.IGNORECASE:
+                continue
+            _collectLiterals(av[-1], literals)
+        elif op in _RepeatOps:
+            flush()
+            minCount, _, body = av
+            if minCount >= 1:
+                _collectLiterals(body, literals)
+        else:
+            flush()
+    flush()
+
+
+# Returns the literal substrings (str or bytes, like the pattern) that every
+# match of the compiled regex contains, longest first.
+def requiredLiterals(regex):
+    if regex.flags & re.IGNORECASE:
+        return []
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return []
+    if _parsedFlags(parsed) & re.IGNORECASE:
+        return []
+    runs = []
+    _collectLiterals(parsed, runs)
+    isBytes = isinstance(regex.pattern, bytes)
+    literals = []
+    for run in runs:
+        if len(run) < MinLiteralLength:
+            continue
+        if isBytes:
+            literal = bytes(run)
+        else:
+            literal = ''.join(chr(c) for c in run)
+        if literal not in literals:
+            literals.append(literal)
+    literals.sort(key=len, reverse=True)
+    return literals[:MaxLiterals]
+
+
+# Cheap check that runs before the regex. If a line is missing any of the
+# literals the regex needs, the regex can't match, so we don't run it.
+class LiteralPrefilter(object):
+    __slots__ = ('literals', 'checked', 'rejected')
+
+    def __init__(self, literals):
+        self.literals = tuple(literals)
+        self.checked = 0
+        self.rejected = 0
+
+    # True if the line can't match the regex.
+    def rejects(self, line):
+        self.checked += 1
+        for literal in self.literals:
+            if literal not in line:
+                self.rejected += 1
+                return True
+        return False
+
+
+# Returns a LiteralPrefilter for the compiled regex, or None if the regex
+# doesn't require any literals (or we couldn't find them).
+def buildPrefilter(regex):
+    if regex is None:
+        return None
+    literals = requiredLiterals(regex)
+    if not literals:
+        return None
+    return LiteralPrefilter(literals)
+
+
+# Adds up the counts of the prefilters into a dictionary with the number of
+# lines checked and rejected, and the rate of rejection.
+def prefilterStats(prefilters, stats=None):
+    if stats is None:
+        stats = {'checked': 0, 'rejected': 0}
+    for prefilter in prefilters:
+        if prefilter is not None:
+            stats['checked'] += prefilter.checked
+            stats['rejected'] += prefilter.rejected
+    if stats['checked']:
+        stats['hitRate'] = float(stats['rejected']) / stats['checked']
+    else:
+        stats['hitRate'] = 0.0
+    return stats
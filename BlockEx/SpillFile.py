@@ -0,0 +1,56 @@
+import array
+import tempfile
+
+
+# Lines that have been pushed out of a bounded StreamContext. They're appended
+# to a temporary file, and we keep the offset of each line, so they can still
+# be read back by number. Line numbers start at firstLine.
+class SpillFile(object):
+    # encoding: how str lines are stored. bytes lines are stored as they are.
+    def __init__(self, firstLine=0, encoding='utf-8', directory=None):
+        self.firstLine = firstLine
+        self.encoding = encoding
+        self._file = tempfile.TemporaryFile('w+b', dir=directory)
+        self._offsets = array.array('Q')
+        self._size = 0
+        self._atEnd = True
+        self._isBytes = None
+
+    def __len__(self):
+        return len(self._offsets)
+
+    # One past the number of the last line in the file.
+    def endLine(self):
+        return self.firstLine + len(self._offsets)
+
+    def append(self, line):
+        if self._isBytes is None:
+            self._isBytes = isinstance(line, bytes)
+        data = line if self._isBytes else \
+            line.encode(self.encoding, 'surrogateescape')
+        if not self._atEnd:
+            self._file.seek(self._size)
+            self._atEnd = True
+        self._offsets.append(self._size)
+        self._file.write(data)
+        self._size += len(data)
+
+    def getLine(self, number):
+        index = number - self.firstLine
+        if index < 0 or index >= len(self._offsets):
+            return None
+        start = self._offsets[index]
+        if index + 1 < len(self._offsets):
+            end = self._offsets[index + 1]
+        else:
+            end = self._size
+        self._file.flush()
+        self._file.seek(start)
+        self._atEnd = False
+        data = self._file.read(end - start)
+        if self._isBytes:
+            return data
+        return data.decode(self.encoding, 'surrogateescape')
+
+    def close(self):
+        self._file.close()
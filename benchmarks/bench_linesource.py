@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Compares the lines/sec of the readline() path of FileStreamParser against
+# the chunked and memory mapped line sources.
+#
+# python -m benchmarks.bench_linesource --lines 1000000
+
+from BlockEx.BlockBase import BlockBase
+from BlockEx.BlockMatchex import PatternMatchex
+from BlockEx.LineSource import openLineSource
+from BlockEx.Parser import FileStreamParser
+
+import argparse
+import os
+import tempfile
+import time
+
+
+class ArchsBlock(BlockBase):
+    def __init__(self):
+        openers = [r'\s+\w+ /\* Debug \*/ = \{',
+                   r'\s+isa = XCBuildConfiguration',
+                   r'\s+buildSettings = \{']
+        matchex = PatternMatchex(blockRegex=r'\s+VALID_ARCHS = "(.+)";')
+        super(ArchsBlock, self).__init__(openingRegexStrings=openers,
+                                         blockMatchex=matchex,
+                                         endingRegexString=r'\s+\};')
+
+
+def writeCorpus(path, numLines):
+    block = ['\t\t939CB4A41C31ED1100720F6E /* Debug */ = {\n',
+             '\t\t\tisa = XCBuildConfiguration;\n',
+             '\t\t\tbuildSettings = {\n',
+             '\t\t\t\tALWAYS_SEARCH_USER_PATHS = NO;\n',
+             '\t\t\t\tVALID_ARCHS = "arm64 armv7 x86_64";\n',
+             '\t\t\t\tSDKROOT = iphoneos;\n',
+             '\t\t\t};\n',
+             '\t\t\tname = Debug;\n',
+             '\t\t};\n']
+    with open(path, 'w', encoding='utf-8') as stream:
+        written = 0
+        while written < numLines:
+            stream.writelines(block)
+            written += len(block)
+    return written
+
+
+def timeReadline(path):
+    start = time.perf_counter()
+    count = 0
+    with open(path, 'r', encoding='utf-8') as stream:
+        line = stream.readline()
+        while line:
+            count += 1
+            line = stream.readline()
+    return count, time.perf_counter() - start
+
+
+def timeSource(path, chunkSize, useMmap):
+    start = time.perf_counter()
+    count = 0
+    source = openLineSource(path, chunkSize=chunkSize, useMmap=useMmap)
+    for _ in source.iterLines():
+        count += 1
+    source.close()
+    return count, time.perf_counter() - start
+
+
+def timeParse(path, **kwargs):
+    parser = FileStreamParser(path, process=False, **kwargs)
+    parser.blockMatchers = [ArchsBlock()]
+    start = time.perf_counter()
+    parser.parse()
+    return time.perf_counter() - start
+
+
+def main():
+    argParser = argparse.ArgumentParser(description=__doc__)
+    argParser.add_argument('--lines', type=int, default=500000)
+    argParser.add_argument('--chunk-size', type=int,
+                           default=1024 * 1024)
+    args = argParser.parse_args()
+
+    handle, path = tempfile.mkstemp(suffix='.pbxproj')
+    os.close(handle)
+    try:
+        numLines = writeCorpus(path, args.lines)
+        print('%d lines, %d bytes' % (numLines, os.path.getsize(path)))
+        results = [
+            ('readline', timeReadline(path)[1]),
+            ('chunked', timeSource(path, args.chunk_size, False)[1]),
+            ('mmap', timeSource(path, args.chunk_size, True)[1]),
+            ('parse readline', timeParse(path)),
+            ('parse chunked', timeParse(path, chunkSize=args.chunk_size)),
+            ('parse mmap', timeParse(path, useMmap=True)),
+        ]
+        for name, elapsed in results:
+            print('%-16s %12.0f lines/sec' % (name, numLines / elapsed))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# Measures how BlockEx.Parallel.parseFiles scales with the number of worker
+# processes, parsing a directory of generated pbxproj files.
+#
+# python -m benchmarks.bench_parallel --files 200 --lines 20000
+
+from BlockEx.Parallel import parseFiles
+from benchmarks.bench_linesource import ArchsBlock, writeCorpus
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+
+def makeMatchers():
+    return [ArchsBlock()]
+
+
+def main():
+    argParser = argparse.ArgumentParser(description=__doc__)
+    argParser.add_argument('--files', type=int, default=100)
+    argParser.add_argument('--lines', type=int, default=20000)
+    argParser.add_argument('--files-per-chunk', type=int, default=1)
+    args = argParser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(directory, 'project%d.pbxproj' % i)
+            writeCorpus(path, args.lines)
+            paths.append(path)
+
+        workerCounts = [1]
+        while workerCounts[-1] * 2 <= (os.cpu_count() or 1):
+            workerCounts.append(workerCounts[-1] * 2)
+
+        baseline = None
+        for workers in [0] + workerCounts:
+            start = time.perf_counter()
+            for result in parseFiles(paths, makeMatchers, maxWorkers=workers,
+                                     filesPerChunk=args.files_per_chunk):
+                if result.error is not None:
+                    print(result.error)
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = elapsed
+            name = 'in process' if workers == 0 else '%d workers' % workers
+            print('%-12s %8.2f files/sec %6.2fx' %
+                  (name, len(paths) / elapsed, baseline / elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
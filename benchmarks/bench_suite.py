@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+# Parses the synthetic corpora (see benchmarks.corpus) with FileStreamParser,
+# BufferStreamParser and UrlStreamParser (from a local HTTP server), sweeping
+# the number of matchers and cooperative vs non-cooperative parsing. For each
+# run, it measures lines/sec, bytes/sec, peak memory, and the time each matcher
+# adds per line, over parsing with no matchers.
+#
+# The results are written as JSON. Given the results of an earlier run
+# (--compare), it reports the runs that got slower by more than --tolerance,
+# and exits with 1 if any did.
+#
+# python -m benchmarks.bench_suite --output results.json
+# python -m benchmarks.bench_suite --compare results.json
+
+from BlockEx.Parser import BufferStreamParser, FileStreamParser, \
+    StreamContext, UrlStreamParser
+from BlockEx.ConnectionPool import ConnectionPool
+from benchmarks.corpus import Corpora, makeMatchers, writeCorpus
+
+import argparse
+import functools
+import http.server
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+
+Parsers = ['file', 'buffer', 'url']
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+# Serves the files in directory on a local port, in a thread.
+def startServer(directory):
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+# Sets up the parsers the same way for each run, so that only parse() is
+# measured. Each one is made by makeParser(), and returns what to parse with.
+class Runner(object):
+    def __init__(self, path, server):
+        self.path = path
+        self.server = server
+        self._context = None
+
+    # The lines of the corpus, in a StreamContext, for BufferStreamParser.
+    def _getContext(self):
+        if self._context is None:
+            self._context = StreamContext()
+            with open(self.path, 'r', encoding='utf-8') as stream:
+                for line in stream:
+                    self._context.bufferLine(line)
+        return self._context
+
+    def makeParser(self, kind):
+        if kind == 'file':
+            return FileStreamParser(self.path, process=False)
+        if kind == 'buffer':
+            return BufferStreamParser(self._getContext(), 0)
+        host = '127.0.0.1:%d' % self.server.server_address[1]
+        # A pool of our own, so the connection isn't shared across runs.
+        parser = UrlStreamParser(host, pool=ConnectionPool())
+        status, reason = parser.setPath('/' + os.path.basename(self.path))
+        if status != 200:
+            raise IOError('HTTP %s %s' % (status, reason))
+        return parser
+
+
+def runOnce(runner, kind, corpus, numMatchers, isCooperative,
+            traceMemory=False):
+    parser = runner.makeParser(kind)
+    parser.isCooperative = isCooperative
+    parser.blockMatchers = makeMatchers(corpus, numMatchers)
+    if traceMemory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    parser.parse()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if traceMemory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+# The best of repeat runs, so that the noise is mostly left out.
+def timeRun(runner, kind, corpus, numMatchers, isCooperative, repeat):
+    return min(runOnce(runner, kind, corpus, numMatchers, isCooperative)[0]
+               for _ in range(repeat))
+
+
+def runSuite(args, directory):
+    results = []
+    server = startServer(directory)
+    try:
+        for corpus in args.corpora:
+            path = os.path.join(directory, 'corpus.%s' % corpus)
+            size = args.html_bytes if Corpora[corpus][2] == 'bytes' \
+                else args.lines
+            numLines = writeCorpus(corpus, path, size)
+            numBytes = os.path.getsize(path)
+            runner = Runner(path, server)
+            for kind in args.parsers:
+                baseline = timeRun(runner, kind, corpus, 0, True, args.repeat)
+                for numMatchers in args.matchers:
+                    for isCooperative in (True, False):
+                        elapsed = timeRun(runner, kind, corpus, numMatchers,
+                                          isCooperative, args.repeat)
+                        peak = None
+                        if args.memory:
+                            peak = runOnce(runner, kind, corpus, numMatchers,
+                                           isCooperative, True)[1]
+                        perMatcher = (elapsed - baseline) / numMatchers / \
+                            numLines * 1e6
+                        result = {'corpus': corpus,
+                                  'parser': kind,
+                                  'matchers': numMatchers,
+                                  'cooperative': isCooperative,
+                                  'lines': numLines,
+                                  'bytes': numBytes,
+                                  'seconds': elapsed,
+                                  'linesPerSec': numLines / elapsed,
+                                  'bytesPerSec': numBytes / elapsed,
+                                  'peakBytes': peak,
+                                  'usecPerLinePerMatcher': perMatcher}
+                        results.append(result)
+                        print('%-8s %-7s %4d %-7s %12.0f lines/sec '
+                              '%8.2f MB/s %8.3f us/line/matcher%s' %
+                              (corpus, kind, numMatchers,
+                               'coop' if isCooperative else 'noncoop',
+                               result['linesPerSec'],
+                               result['bytesPerSec'] / 1e6, perMatcher,
+                               '' if peak is None else
+                               ' %8.1f MB peak' % (peak / 1e6)))
+                        sys.stdout.flush()
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def _resultKey(result):
+    return (result['corpus'], result['parser'], result['matchers'],
+            result['cooperative'])
+
+
+# Returns the results that are slower than in the earlier ones by more than
+# tolerance (a fraction), as (result, earlier result).
+def findRegressions(results, earlier, tolerance):
+    earlierResults = dict((_resultKey(result), result) for result in earlier)
+    regressions = []
+    for result in results:
+        old = earlierResults.get(_resultKey(result))
+        if old is not None and \
+           result['linesPerSec'] < old['linesPerSec'] * (1 - tolerance):
+            regressions.append((result, old))
+    return regressions
+
+
+def _intList(text):
+    return [int(value) for value in text.split(',')]
+
+
+def _nameList(choices):
+    def parse(text):
+        names = text.split(',')
+        for name in names:
+            if name not in choices:
+                raise argparse.ArgumentTypeError('%s is not one of %s' %
+                                                 (name, ', '.join(choices)))
+        return names
+    return parse
+
+
+def main():
+    argParser = argparse.ArgumentParser(description=__doc__)
+    argParser.add_argument('--lines', type=int, default=50000,
+                           help='lines in the pbxproj and log corpora')
+    argParser.add_argument('--html-bytes', type=int, default=1000000,
+                           help='bytes in the long line of the html corpus')
+    argParser.add_argument('--corpora', type=_nameList(sorted(Corpora)),
+                           default=sorted(Corpora))
+    argParser.add_argument('--parsers', type=_nameList(Parsers),
+                           default=Parsers)
+    argParser.add_argument('--matchers', type=_intList, default=[1, 4, 16, 64],
+                           help='matcher counts to sweep, e.g. 1,4,16')
+    argParser.add_argument('--repeat', type=int, default=3)
+    argParser.add_argument('--no-memory', dest='memory', action='store_false',
+                           help="don't measure peak memory (a traced run)")
+    argParser.add_argument('--output', help='where to write the JSON results')
+    argParser.add_argument('--compare',
+                           help='JSON results of an earlier run to compare to')
+    argParser.add_argument('--tolerance', type=float, default=0.15)
+    args = argParser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        results = runSuite(args, directory)
+    finally:
+        shutil.rmtree(directory)
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'args': vars(args),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            json.dump(report, stream, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as stream:
+            earlier = json.load(stream)['results']
+        regressions = findRegressions(results, earlier, args.tolerance)
+        for result, old in regressions:
+            print('REGRESSION: %s %s %d matchers %s: %.0f lines/sec, was %.0f'
+                  % (result['corpus'], result['parser'], result['matchers'],
+                     'coop' if result['cooperative'] else 'noncoop',
+                     result['linesPerSec'], old['linesPerSec']))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# Generates synthetic corpora for the benchmarks, at whatever size they need,
+# and the matchers to parse each of them with:
+#
+# o pbxproj: nested build configuration blocks, like tests/project.pbxproj.
+# o html: a page with one huge line of markup, like tests/zara.test.
+# o log: a log stream, with requests from many workers interleaved.
+#
+# python -m benchmarks.corpus pbxproj out.pbxproj --size 100000
+
+from BlockEx.BlockBase import BlockBase
+from BlockEx.BlockMatchex import PatternMatchex
+
+import argparse
+import random
+
+
+# How many different settings, workers and products the corpora have, so that
+# each matcher has something different to look for.
+NumKeys = 64
+
+DebugOpeners = [r'\s+\w+ /\* (?:Debug|Release) \*/ = \{',
+                r'\s+isa = XCBuildConfiguration;',
+                r'\s+buildSettings = \{']
+
+
+# Finds one setting of the build configurations.
+class SettingBlock(BlockBase):
+    def __init__(self, key):
+        matchex = PatternMatchex(blockRegex=r'\s+%s = (.+);' % key)
+        super(SettingBlock, self).__init__(openingRegexStrings=DebugOpeners,
+                                           blockMatchex=matchex,
+                                           endingRegexString=r'\s+\};')
+
+
+# Finds one product in the big line of the page, after the navigation.
+class ProductBlock(BlockBase):
+    def __init__(self, number):
+        openers = [r'\s+<li><a href="http://www\.example\.com/contact',
+                   r'\s+</ul>',
+                   r'\s+</li>']
+        matchex = PatternMatchex(
+            blockRegex=r'.*?<div class="product" data-id="%d" '
+                       r'data-name="([^"]*)"' % number)
+        super(ProductBlock, self).__init__(openingRegexStrings=openers,
+                                           blockMatchex=matchex,
+                                           endingRegexString=r'\s+\(function')
+
+
+# Finds the status of one worker's requests.
+class RequestBlock(BlockBase):
+    def __init__(self, number):
+        worker = r'\S+ \w+ worker%d: ' % number
+        matchex = PatternMatchex(blockRegex=worker + r'status=(\d+) (.*)')
+        super(RequestBlock, self).__init__(
+            openingRegexStrings=[worker + 'request start'],
+            blockMatchex=matchex,
+            endingRegexString=worker + 'request end')
+
+
+def writePbxproj(path, numLines, seed=0):
+    rand = random.Random(seed)
+    written = 0
+    with open(path, 'w', encoding='utf-8') as stream:
+        stream.write('// !$*UTF8*$!\n{\n\tobjects = {\n')
+        written += 3
+        configuration = 0
+        while written < numLines:
+            name = 'Debug' if configuration % 2 == 0 else 'Release'
+            lines = ['\t\t%024X /* %s */ = {\n' % (configuration, name),
+                     '\t\t\tisa = XCBuildConfiguration;\n',
+                     '\t\t\tbuildSettings = {\n']
+            for key in rand.sample(range(NumKeys), NumKeys // 4):
+                lines.append('\t\t\t\tSETTING_%d = "value %d";\n' %
+                             (key, rand.randint(0, 1000)))
+            lines += ['\t\t\t};\n', '\t\t\tname = %s;\n' % name, '\t\t};\n']
+            stream.writelines(lines)
+            written += len(lines)
+            configuration += 1
+        stream.write('\t};\n}\n')
+        written += 2
+    return written
+
+
+def writeHtml(path, numBytes, seed=0):
+    rand = random.Random(seed)
+    head = ['<html>\n', '<body>\n', '<nav>\n', '  <ul>\n',
+            '      <li><a href="http://www.example.com/about">About</a></li>\n',
+            '      <li><a href="http://www.example.com/contact">Contact</a>'
+            '</li>\n',
+            '    </ul>\n',
+            '  </li>\n']
+    tail = ['  (function(){ window.shop.ready(); })();\n', '</body>\n',
+            '</html>\n']
+    with open(path, 'w', encoding='utf-8') as stream:
+        stream.writelines(head)
+        written = 0
+        product = 0
+        while written < numBytes:
+            markup = '<div class="product" data-id="%d" data-name="item %d">' \
+                     '<span class="price">%d.%02d</span></div>' % \
+                     (product % NumKeys, product, rand.randint(1, 500),
+                      rand.randint(0, 99))
+            stream.write(markup)
+            written += len(markup)
+            product += 1
+        stream.write(';window.shop.dataLayer = {"products": %d};\n' % product)
+        stream.writelines(tail)
+    return len(head) + 1 + len(tail)
+
+
+def writeLog(path, numLines, seed=0):
+    rand = random.Random(seed)
+    levels = ['INFO', 'INFO', 'INFO', 'DEBUG', 'WARN']
+    # Each worker goes through its request one line at a time.
+    steps = {}
+    with open(path, 'w', encoding='utf-8') as stream:
+        for number in range(numLines):
+            worker = rand.randrange(NumKeys)
+            step = steps.get(worker, 0)
+            stamp = '2026-10-18T%02d:%02d:%02d.%03d' % \
+                (number // 3600000 % 24, number // 60000 % 60,
+                 number // 1000 % 60, number % 1000)
+            if step == 0:
+                message = 'INFO worker%d: request start' % worker
+            elif step == 3:
+                message = 'INFO worker%d: request end' % worker
+            elif step == 2:
+                message = '%s worker%d: status=%d elapsed=%dms' % \
+                    (rand.choice(levels), worker,
+                     rand.choice((200, 200, 304, 404, 500)),
+                     rand.randint(1, 900))
+            else:
+                message = '%s worker%d: handling /items/%d' % \
+                    (rand.choice(levels), worker, rand.randint(0, 99999))
+            steps[worker] = (step + 1) % 4
+            stream.write('%s %s\n' % (stamp, message))
+    return numLines
+
+
+# name: (write(path, size), makeMatcher(number), what size is)
+Corpora = {
+    'pbxproj': (writePbxproj,
+                lambda number: SettingBlock('SETTING_%d' % (number % NumKeys)),
+                'lines'),
+    'html': (writeHtml, lambda number: ProductBlock(number % NumKeys),
+             'bytes'),
+    'log': (writeLog, lambda number: RequestBlock(number % NumKeys), 'lines'),
+}
+
+
+# Writes the corpus to path, and returns how many lines it has.
+def writeCorpus(name, path, size, seed=0):
+    return Corpora[name][0](path, size, seed)
+
+
+# Returns count matchers for the corpus, each looking for something
+# different (until there are more than NumKeys of them).
+def makeMatchers(name, count):
+    makeMatcher = Corpora[name][1]
+    return [makeMatcher(number) for number in range(count)]
+
+
+def main():
+    argParser = argparse.ArgumentParser(description=__doc__)
+    argParser.add_argument('corpus', choices=sorted(Corpora))
+    argParser.add_argument('path')
+    argParser.add_argument('--size', type=int, default=100000,
+                           help='lines (bytes for html)')
+    argParser.add_argument('--seed', type=int, default=0)
+    args = argParser.parse_args()
+    numLines = writeCorpus(args.corpus, args.path, args.size, args.seed)
+    print('%s: %d lines' % (args.path, numLines))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+from BlockEx.AsyncParser import AsyncUrlStreamParser, parseAll
+from BlockEx.BlockMatchex import PatternMatchex
+from BlockEx.BlockBase import BlockBase
+
+import asyncio
+import gzip
+
+import unittest
+
+
+def pageBody(page):
+    return ''.join('<li>item %d: page %d café</li>\n' % (i, page)
+                   for i in range(100))
+
+
+# A stand in HTTP server. /page/N returns the page with Content-Length,
+# /chunked/N with chunked transfer encoding, /gzip/N compressed, and
+# /moved/N redirects to /page/N.
+class StandInServer(object):
+    def __init__(self):
+        self.server = None
+        self.active = 0
+        self.maxActive = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.host = '127.0.0.1:%d' % self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.active += 1
+        self.maxActive = max(self.maxActive, self.active)
+        try:
+            requestLine = (await reader.readline()).decode('latin-1')
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            kind, page = requestLine.split()[1].strip('/').split('/')
+            body = pageBody(int(page)).encode('utf-8')
+            # Give the other requests a chance to run.
+            await asyncio.sleep(0.01)
+            if kind == 'moved':
+                self._writeHead(writer, '302 Found',
+                                ['Location: http://%s/page/%s' %
+                                 (self.host, page),
+                                 'Content-Length: 0'])
+            elif kind == 'chunked':
+                self._writeHead(writer, '200 OK',
+                                ['Transfer-Encoding: chunked'])
+                for start in range(0, len(body), 333):
+                    piece = body[start:start + 333]
+                    writer.write(b'%x\r\n' % len(piece) + piece + b'\r\n')
+                    await writer.drain()
+                writer.write(b'0\r\n\r\n')
+            elif kind == 'gzip':
+                body = gzip.compress(body)
+                self._writeHead(writer, '200 OK',
+                                ['Content-Encoding: gzip',
+                                 'Content-Length: %d' % len(body)])
+                writer.write(body)
+            elif kind == 'page':
+                self._writeHead(writer, '200 OK',
+                                ['Content-Length: %d' % len(body)])
+                writer.write(body)
+            else:
+                self._writeHead(writer, '404 Not Found',
+                                ['Content-Length: 0'])
+            await writer.drain()
+        finally:
+            self.active -= 1
+            writer.close()
+
+    def _writeHead(self, writer, status, headers):
+        lines = ['HTTP/1.1 %s' % status,
+                 'Content-Type: text/html; charset=utf-8'] + headers
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+
+class ItemBlock(BlockBase):
+    def __init__(self):
+        matchex = PatternMatchex(blockRegex=r'<li>item (\d+): (.+)</li>')
+        super(ItemBlock, self).__init__(openingRegexStrings=[],
+                                        blockMatchex=matchex,
+                                        endingRegexString=None)
+
+
+class ItemParser(AsyncUrlStreamParser):
+    def __init__(self, host, **kwargs):
+        super(ItemParser, self).__init__(host, **kwargs)
+        self.items = []
+        self.blockMatchers = [ItemBlock(), ]
+
+    def _handleLine(self, matcher):
+        self.items.append(matcher.blockMatchex.matchStrings[1])
+
+
+class TestAsyncUrlStreamParser(unittest.TestCase):
+
+    def _run(self, paths, concurrency=10, **kwargs):
+        server = StandInServer()
+
+        async def run():
+            await server.start()
+            try:
+                return await parseAll(
+                    paths, lambda: ItemParser(server.host, **kwargs),
+                    concurrency)
+            finally:
+                await server.stop()
+
+        return asyncio.run(run()), server
+
+    def _checkPage(self, result, page):
+        self.assertEqual(200, result.status, result.path)
+        self.assertEqual(100, len(result.parser.items), result.path)
+        self.assertEqual('page %d café' % page, result.parser.items[-1])
+        self.assertEqual(pageBody(page).splitlines(True),
+                         result.parser._lines[:100])
+
+    def testPages(self):
+        paths = ['/page/%d' % i for i in range(12)]
+        results, server = self._run(paths, concurrency=4)
+        self.assertEqual(paths, [result.path for result in results])
+        for page, result in enumerate(results):
+            self._checkPage(result, page)
+        self.assertTrue(1 < server.maxActive <= 4)
+
+    def testTransfers(self):
+        paths = ['/chunked/1', '/gzip/2', '/moved/3']
+        results, _ = self._run(paths, acceptCompressed=True, chunkSize=17)
+        for page, result in enumerate(results, 1):
+            self._checkPage(result, page)
+
+    def testNotFound(self):
+        results, _ = self._run(['/missing/1'])
+        self.assertEqual(404, results[0].status)
+        self.assertEqual('Not Found', results[0].reason)
+        self.assertEqual([], results[0].parser.items)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+from BlockEx.BlockMatchex import PatternMatchex, DictMatchex, KeywordMatchex
+from BlockEx.BlockBase import BlockBase
+from tests.test_prefilter import ArchsBlock
+
+import pickle
+
+import unittest
+
+
+class RecordingDelegate(object):
+    def __init__(self):
+        self.events = []
+
+    def onOpeningMatch(self, index, match):
+        self.events.append(('open', index))
+
+    def onRegexMatch(self, match):
+        self.events.append(('match', match.group(1)))
+
+    def onClosingMatch(self, match):
+        self.events.append(('close', ))
+
+
+class TestBlockTable(unittest.TestCase):
+
+    def _block(self):
+        return BlockBase([r'begin', r'\{'], PatternMatchex(r'value (\w+)'),
+                         r'\}')
+
+    def testSteps(self):
+        block = self._block()
+        block.delegate = RecordingDelegate()
+        lines = ['begin', 'x', 'begin', '{', 'value a', 'other', '}',
+                 'value b']
+        states = []
+        for line in lines:
+            if block.wantsLine(line) and \
+               block.getState() == block.InsideBlockState:
+                block.processLine(line)
+                block.isFinished(line)
+            states.append(block.getState())
+        self.assertEqual([0, 0, 0, 1, 1, 1, 0, 0], states)
+        self.assertEqual([('open', 0), ('open', 0), ('open', 1),
+                          ('match', 'a'), ('close', )], block.delegate.events)
+        self.assertEqual(0, block._matchIndex)
+
+    def testSharedTable(self):
+        self.assertIs(ArchsBlock()._table, ArchsBlock()._table)
+        self.assertIsNot(ArchsBlock()._table, self._block()._table)
+        bytesBlock = ArchsBlock()
+        bytesBlock.useBytes()
+        self.assertIsInstance(bytesBlock._table[0][1].pattern, bytes)
+        self.assertIsInstance(ArchsBlock()._table[0][1].pattern, str)
+
+    def testSlots(self):
+        matchexes = [PatternMatchex(r'(\w+)'),
+                     DictMatchex(r'(\s*)', r'\s+KEY = (.*);', 'KEY', 'b', []),
+                     KeywordMatchex(['a', 'b'])]
+        for matchex in matchexes:
+            block = BlockBase([], matchex, None)
+            self.assertFalse(hasattr(block, '__dict__'))
+            self.assertFalse(hasattr(matchex, '__dict__'),
+                             type(matchex).__name__)
+
+    def testPickle(self):
+        block = pickle.loads(pickle.dumps(self._block()))
+        self.assertTrue(block.wantsLine('begin'))
+        self.assertTrue(block.wantsLine('{'))
+        self.assertEqual(block.InsideBlockState, block.getState())
+        self.assertTrue(block.processLine('value x')[0])
+        self.assertEqual(['x'], block.blockMatchex.matchStrings)
+
+
+if __name__ == '__main__':
+    unittest.main()
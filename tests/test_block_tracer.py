@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+from BlockEx.BlockMatchex import PatternMatchex
+from BlockEx.BlockBase import BlockBase
+from BlockEx.BlockTracer import BlockTracer
+from BlockEx.Parser import FileStreamParser
+from tests.test_matcher_set import SdkBlock
+
+import json
+import os
+import shutil
+import tempfile
+
+import unittest
+
+
+# Every configuration starts opening this block, but only the ones with
+# SWIFT_VERSION as their first setting open it.
+class SwiftBlock(BlockBase):
+    def __init__(self):
+        openers = [r'\s+isa = XCBuildConfiguration;',
+                   r'\s+buildSettings = \{',
+                   r'\s+SWIFT_VERSION = ']
+        matchex = PatternMatchex(blockRegex=r'\s+SDKROOT = (\w+);')
+        super(SwiftBlock, self).__init__(openingRegexStrings=openers,
+                                         blockMatchex=matchex,
+                                         endingRegexString=r'\s+\};')
+
+
+class TestBlockTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.closers = 0
+        self.resets = []
+
+    def onOpeningMatch(self, index, match):
+        pass
+
+    def onRegexMatch(self, match):
+        pass
+
+    def onClosingMatch(self, match):
+        self.closers += 1
+
+    def onOpeningReset(self, index):
+        self.resets.append(index)
+
+    def _parse(self, path='tests/project.pbxproj', **kwargs):
+        parser = FileStreamParser(path, process=False)
+        parser.isCooperative = False
+        parser.blockMatchers = [SdkBlock('Debug'), SwiftBlock()]
+        for matcher in parser.blockMatchers:
+            matcher.delegate = self
+        tracer = BlockTracer(parser, **kwargs)
+        parser.parse()
+        tracer.detach()
+        return parser, tracer
+
+    def _spans(self, tracer, tid, name, outcome=None):
+        return [event for event in tracer.events
+                if event['ph'] == 'X' and event['tid'] == tid and
+                event['name'] == name and
+                (outcome is None or event['args']['outcome'] == outcome)]
+
+    def testSpans(self):
+        parser, tracer = self._parse()
+        with open('tests/project.pbxproj', 'r', encoding='utf-8') as stream:
+            numDebug = stream.read().count('/* Debug */ = {')
+        blocks = self._spans(tracer, 0, 'block')
+        self.assertEqual(numDebug, len(blocks))
+        self.assertEqual(numDebug, len(self._spans(tracer, 0, 'opening',
+                                                   'opened')))
+        for block in blocks:
+            self.assertEqual('closed', block['args']['outcome'])
+            self.assertTrue(block['args']['startLine'] <
+                            block['args']['endLine'])
+            self.assertTrue(block['dur'] >= 0)
+        # The Swift block resets at its last opener, and the delegates it had
+        # still got their callbacks.
+        resets = self._spans(tracer, 1, 'opening', 'reset at opener 2')
+        self.assertTrue(len(resets) > 0)
+        self.assertEqual(len(resets), self.resets.count(2))
+        self.assertEqual(len(blocks) + len(self._spans(tracer, 1, 'block')),
+                         self.closers)
+        self.assertIs(self, parser.blockMatchers[0].delegate)
+
+    def testLineTimeline(self):
+        _, tracer = self._parse(useLineNumbers=True)
+        for event in tracer.events:
+            if event['ph'] == 'X':
+                self.assertEqual(event['args']['startLine'], event['ts'])
+                self.assertEqual(event['args']['endLine'] + 1,
+                                 event['ts'] + event['dur'])
+
+    def testAbandonedAndWrite(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'cut.pbxproj')
+        tracePath = os.path.join(directory, 'trace.json')
+        try:
+            # Cut the file off inside the first Debug build settings.
+            with open('tests/project.pbxproj', 'r',
+                      encoding='utf-8') as stream:
+                lines = stream.readlines()
+            with open(path, 'w', encoding='utf-8') as stream:
+                stream.writelines(lines[:500])
+            _, tracer = self._parse(path, maxEvents=3)
+            tracer.write(tracePath)
+            with open(tracePath, 'r', encoding='utf-8') as stream:
+                trace = json.load(stream)
+            _, wholeTracer = self._parse(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(3, len(tracer.events))
+        self.assertTrue(tracer.droppedEvents > 0)
+        self.assertEqual(tracer.droppedEvents,
+                         trace['otherData']['droppedEvents'])
+        names = [event['args']['name'] for event in trace['traceEvents']
+                 if event['name'] == 'thread_name']
+        self.assertEqual(['0 SdkBlock', '1 SwiftBlock'], names)
+        # The last event is the abandoned Debug block.
+        self.assertEqual('abandoned', wholeTracer.events[-1]['name'])
+        self.assertEqual(0, wholeTracer.events[-1]['tid'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+from BlockEx.Parser import FileStreamParser
+from BlockEx.BlockMatchex import MultiPatternMatchex
+from BlockEx.BlockBase import BlockBase
+from tests.test_prefilter import ArchsBlock
+
+import os
+import tempfile
+
+import unittest
+
+
+class FrameworkBlock(BlockBase):
+    def __init__(self):
+        matchex = MultiPatternMatchex(blockRegex=r'(\w+)\.framework')
+        super(FrameworkBlock, self).__init__(openingRegexStrings=[],
+                                             blockMatchex=matchex,
+                                             endingRegexString=None)
+
+
+class CollectingParser(FileStreamParser):
+    def _handleLine(self, matcher):
+        if not hasattr(self, 'matches'):
+            setattr(self, 'matches', [])
+        self.matches.append((matcher.blockMatchex.matchStrings,
+                             matcher.blockMatchex.groups))
+
+
+class TestBytesMode(unittest.TestCase):
+
+    def _parse(self, path, **kwargs):
+        parser = CollectingParser(path, **kwargs)
+        parser.isCooperative = False
+        parser.blockMatchers = [ArchsBlock(), FrameworkBlock()]
+        parser.parse()
+        return parser
+
+    def testSameMatches(self):
+        expected = self._parse('tests/project.pbxproj', process=False)
+        for kwargs in ({}, {'chunkSize': 1024}, {'useMmap': True}):
+            parser = self._parse('tests/project.pbxproj', process=False,
+                                 bytesMode=True, **kwargs)
+            self.assertEqual(expected.matches, parser.matches)
+        # Decoded on access, so they are str again
+        self.assertTrue(isinstance(parser.matches[0][0][0], str))
+
+    def testOutputPassesThrough(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        with open('tests/project.pbxproj', 'rb') as stream:
+            original = stream.read()
+        with open(path, 'wb') as stream:
+            stream.write(original)
+        try:
+            self._parse(path, process=True, bytesMode=True)
+            with open(path + '.new', 'rb') as stream:
+                self.assertEqual(original, stream.read())
+        finally:
+            os.remove(path)
+            os.remove(path + '.new')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+from BlockEx.ConnectionPool import ConnectionPool, sharedSSLContext
+from BlockEx.Parser import UrlStreamParser
+from BlockEx.BlockMatchex import PatternMatchex
+from BlockEx.BlockBase import BlockBase
+
+import http.server
+import socket
+import threading
+
+import unittest
+
+
+SmallBody = ''.join('<li>item %d</li>\n' % i for i in range(50))
+LargeBody = ''.join('<li>item %d</li>\n' % i for i in range(50000))
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+
+    def setup(self):
+        super(KeepAliveHandler, self).setup()
+        KeepAliveHandler.connections.add(self.client_address)
+
+    def do_GET(self):
+        body = LargeBody if self.path == '/large' else SmallBody
+        body = body.encode('utf-8')
+        self.send_response(200 if self.path != '/missing' else 404)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ItemBlock(BlockBase):
+    def __init__(self):
+        matchex = PatternMatchex(blockRegex=r'<li>item (\d+)</li>')
+        super(ItemBlock, self).__init__(openingRegexStrings=[],
+                                        blockMatchex=matchex,
+                                        endingRegexString=None)
+
+
+class FirstItemsParser(UrlStreamParser):
+    # Only wants the first few items, so it doesn't need the rest of the body.
+    def _handleLine(self, matcher):
+        self.items.append(matcher.blockMatchex.matchStrings[0])
+        if len(self.items) == 3:
+            self.forceConnectionClose = True
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        KeepAliveHandler.connections = set()
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      KeepAliveHandler)
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.host = '127.0.0.1:%d' % self.server.server_address[1]
+        self.pool = ConnectionPool()
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _parser(self, parserClass=UrlStreamParser, **kwargs):
+        parser = parserClass(self.host, pool=self.pool, **kwargs)
+        parser.items = []
+        parser.blockMatchers = [ItemBlock(), ]
+        return parser
+
+    def _parse(self, parser, path):
+        status, _ = parser.setPath(path)
+        self.assertEqual(200, status)
+        parser.parse()
+
+    def testReuseAcrossPaths(self):
+        parser = self._parser()
+        for _ in range(3):
+            self._parse(parser, '/small')
+        self.assertEqual(1, len(KeepAliveHandler.connections))
+        self.assertEqual(1, self.pool.opened)
+        self.assertEqual(2, self.pool.reused)
+
+    def testReuseAcrossParsers(self):
+        for _ in range(3):
+            self._parse(self._parser(), '/small')
+        self._parser().setPath('/missing')
+        self.assertEqual(1, len(KeepAliveHandler.connections))
+        self.assertEqual(1, self.pool.getIdleCount(self.host))
+
+    def testStaleConnection(self):
+        self._parse(self._parser(), '/small')
+        # The server closes the idle connection behind our back.
+        self.pool._idle[(self.host, False)][0].sock.shutdown(
+            socket.SHUT_RDWR)
+        self._parse(self._parser(), '/small')
+        self.assertEqual(2, self.pool.opened)
+
+    def testForceConnectionClose(self):
+        parser = self._parser(FirstItemsParser, chunkSize=4096)
+        self._parse(parser, '/large')
+        self.assertEqual(0, self.pool.getIdleCount())
+
+    def testLargeRemainderDropped(self):
+        parser = self._parser(chunkSize=4096, maxDrainBytes=1024)
+        parser.setPath('/large')
+        # Parse nothing, so all of the body is left.
+        parser.completeParsing()
+        self.assertEqual(0, self.pool.getIdleCount())
+
+        parser = self._parser(chunkSize=4096)
+        parser.setPath('/small')
+        parser.completeParsing()
+        self.assertEqual(1, self.pool.getIdleCount())
+
+    def testSharedSSLContext(self):
+        self.assertIs(sharedSSLContext(), sharedSSLContext())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+from BlockEx.ConnectionPool import ConnectionPool
+from BlockEx.Parser import FileStreamParser, StreamParser
+from tests.test_matcher_set import NameBlock, RecordingParser, SdkBlock, \
+    SettingBlock
+from tests.test_one_line import OneLineBlock
+from tests.test_connection_pool import ItemBlock, KeepAliveHandler
+from tests.test_url_parser import ItemParser, startServer
+
+import os
+import shutil
+import tempfile
+
+import unittest
+
+
+# Done after the first match
+class FirstMatchParser(RecordingParser):
+    def _handleLine(self, matcher):
+        super(FirstMatchParser, self)._handleLine(matcher)
+        return True
+
+
+class TestEarlyStop(unittest.TestCase):
+
+    def _parse(self, parserClass=RecordingParser, matchers=None,
+               path='tests/project.pbxproj', **kwargs):
+        parser = parserClass(path, **kwargs)
+        parser.matches = []
+        parser.blockMatchers = matchers or [SdkBlock('Debug'),
+                                            SdkBlock('Release')]
+        return parser
+
+    def testShouldExit(self):
+        parser = self._parse(FirstMatchParser, process=False)
+        parser.parse()
+        self.assertEqual(StreamParser.StopOnExit, parser.stopReason)
+        self.assertEqual(1, len(parser.matches))
+        firstLine = parser.lineNumber
+
+        parser = self._parse(FirstMatchParser, process=False)
+        parser.stopOnExit = False
+        parser.parse()
+        self.assertIsNone(parser.stopReason)
+        self.assertTrue(len(parser.matches) > 1)
+        self.assertTrue(parser.lineNumber > firstLine)
+
+    def testMaxMatches(self):
+        parser = self._parse(process=False)
+        parser.maxMatches = 3
+        parser.parse()
+        self.assertEqual(StreamParser.StopOnMaxMatches, parser.stopReason)
+        self.assertEqual(3, parser.matchCount)
+        self.assertEqual(3, len(parser.matches))
+        # The same matches as the start of a whole parse.
+        whole = self._parse(process=False)
+        whole.parse()
+        self.assertIsNone(whole.stopReason)
+        self.assertEqual(whole.matches[:3], parser.matches)
+
+    def testAllFound(self):
+        parser = self._parse(matchers=[SettingBlock(), NameBlock(),
+                                       SdkBlock('Debug')],
+                             process=False)
+        parser.isCooperative = False
+        parser.stopWhenAllFound = True
+        parser.parse()
+        self.assertEqual(StreamParser.StopOnAllFound, parser.stopReason)
+        found = set(match[0] for match in parser.matches)
+        self.assertEqual(set([0, 1]), found - set([2]))
+        # Matchers with an ending regex don't count, so without any others,
+        # we never stop.
+        parser = self._parse(process=False)
+        parser.stopWhenAllFound = True
+        parser.parse()
+        self.assertIsNone(parser.stopReason)
+
+    def testProcessCopiesRest(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'project.pbxproj')
+        shutil.copy('tests/project.pbxproj', path)
+        try:
+            for kwargs in ({}, {'chunkSize': 4096}, {'bytesMode': True}):
+                parser = self._parse(FirstMatchParser, path=path, **kwargs)
+                parser.parse()
+                self.assertEqual(StreamParser.StopOnExit, parser.stopReason)
+                with open(path, 'rb') as source, \
+                        open(path + '.new', 'rb') as output:
+                    self.assertEqual(source.read(), output.read(),
+                                     str(kwargs))
+        finally:
+            shutil.rmtree(directory)
+
+    def testIterMatches(self):
+        parser = FileStreamParser('tests/easy.test', process=False)
+        parser.blockMatchers = [OneLineBlock()]
+        parser.maxMatches = 1
+        records = list(parser.iterMatches())
+        self.assertEqual([1], [record.lineNumber for record in records])
+        self.assertEqual(1, parser.lineNumber)
+
+    def testDropsConnection(self):
+        server = startServer(KeepAliveHandler)
+        host = '127.0.0.1:%d' % server.server_address[1]
+        pool = ConnectionPool()
+        try:
+            for maxMatches, idle in ((None, 1), (5, 0)):
+                parser = ItemParser(host, pool=pool)
+                parser.items = []
+                parser.blockMatchers = [ItemBlock()]
+                parser.maxMatches = maxMatches
+                status, _ = parser.setPath('/')
+                self.assertEqual(200, status)
+                parser.parse()
+                # A whole body is read, and the connection is reused. If we
+                # stopped, it's dropped instead of reading the rest.
+                self.assertEqual(idle, pool.getIdleCount(host))
+                self.assertEqual(5 if maxMatches else 50, len(parser.items))
+        finally:
+            pool.close()
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
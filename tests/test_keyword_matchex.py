@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+from BlockEx.Parser import FileStreamParser
+from BlockEx.AhoCorasick import KeywordAutomaton
+from BlockEx.BlockMatchex import KeywordMatchex, MultiPatternMatchex
+from BlockEx.BlockBase import BlockBase
+
+import unittest
+
+
+Names = ['FFKit', 'FFKitX', 'FFKitTests', 'Foundation', 'UIKit']
+
+
+class NamesBlock(BlockBase):
+    def __init__(self, matchex):
+        super(NamesBlock, self).__init__(openingRegexStrings=[],
+                                         blockMatchex=matchex,
+                                         endingRegexString=r'\s+\};')
+
+
+class NamesParser(FileStreamParser):
+    def _handleLine(self, matcher):
+        self.found.append(list(matcher.blockMatchex.groups))
+
+
+class TestKeywordAutomaton(unittest.TestCase):
+
+    def testOverlapping(self):
+        automaton = KeywordAutomaton(['he', 'she', 'his', 'hers'])
+        matches = [(automaton.keywords[index], start, end) for index, start, end
+                   in automaton.findAll('ushers', overlapping=True)]
+        self.assertEqual([('she', 1, 4), ('hers', 2, 6), ('he', 2, 4)],
+                         matches)
+
+    def testLeftmostLongest(self):
+        automaton = KeywordAutomaton(['he', 'she', 'his', 'hers'])
+        matches = [(automaton.keywords[index], start, end) for index, start, end
+                   in automaton.findAll('ushers his')]
+        self.assertEqual([('she', 1, 4), ('his', 7, 10)], matches)
+
+    def testBytes(self):
+        automaton = KeywordAutomaton([b'ab', b'bc'])
+        self.assertEqual([(0, 0, 2), (1, 3, 5)], automaton.findAll(b'abxbc'))
+
+
+class TestKeywordMatchex(unittest.TestCase):
+
+    def testSameAsMultiPattern(self):
+        keyword = KeywordMatchex(Names, wholeWords=True)
+        multi = MultiPatternMatchex(r'\b(%s)\b' % '|'.join(
+            sorted(Names, key=len, reverse=True)))
+        line = '\t\t939CB49D /* FFKit.framework in Frameworks */ = {FFKitX};\n'
+        keyword.matchLine(line, keyword.testMatch(line))
+        multi.matchLine(line, multi.testMatch(line))
+        self.assertEqual(multi.groups, keyword.groups)
+        self.assertEqual(['FFKit', 'FFKitX'], keyword.matchStrings)
+        self.assertIsNone(keyword.testMatch('FFKitXY\n'))
+
+    def testParse(self):
+        found = {}
+        for bytesMode in (False, True):
+            parser = NamesParser('tests/project.pbxproj', process=False,
+                                 bytesMode=bytesMode)
+            parser.found = []
+            parser.blockMatchers = [NamesBlock(KeywordMatchex(Names)), ]
+            parser.parse()
+            found[bytesMode] = parser.found
+        self.assertTrue(len(found[False]) > 0)
+        self.assertEqual(found[False], found[True])
+        self.assertIn(('FFKit', (30, 35)), found[False][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+from BlockEx import LineEdits as LineEditsModule
+from BlockEx.BlockMatchex import DictMatchex, PatternMatchex
+from BlockEx.BlockBase import BlockBase
+from BlockEx.LineEdits import LineEdits, copySpan, findLines
+from BlockEx.Parser import FileStreamParser
+
+import os
+import shutil
+import stat
+import tempfile
+
+import unittest
+
+
+DebugOpeners = [r'\s+\w+ /\* Debug \*/ = \{',
+                r'\s+isa = XCBuildConfiguration',
+                r'\s+buildSettings = \{']
+
+
+# Adds macosx to the SDKROOT of the Debug build settings.
+class SdkRootBlock(BlockBase):
+    def __init__(self):
+        matchex = DictMatchex(r'(\s+).+;', r'\s+SDKROOT = ([a-z0-9.]+);',
+                              'SDKROOT', 'macosx', [])
+        super(SdkRootBlock, self).__init__(DebugOpeners, matchex, r'\s+\};')
+
+
+class FindSdkBlock(BlockBase):
+    def __init__(self):
+        matchex = PatternMatchex(blockRegex=r'\s+SDKROOT = (.+);')
+        super(FindSdkBlock, self).__init__(DebugOpeners, matchex, r'\s+\};')
+
+
+class TestLineEdits(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'project.pbxproj')
+        shutil.copy('tests/project.pbxproj', self.path)
+        with open(self.path, 'rb') as stream:
+            self.source = stream.read()
+
+    def tearDown(self):
+        LineEditsModule.ChunkSize = 1024 * 1024
+        shutil.rmtree(self.directory)
+
+    def _parse(self, matcherClass, **kwargs):
+        parser = FileStreamParser(self.path, **kwargs)
+        parser.blockMatchers = [matcherClass()]
+        parser.parse()
+        return parser
+
+    def _read(self, path):
+        with open(path, 'rb') as stream:
+            return stream.read()
+
+    def testEditsMatchWholeOutput(self):
+        for bytesMode in (False, True):
+            self._parse(SdkRootBlock, bytesMode=bytesMode)
+            expected = self._read(self.path + '.new')
+            os.remove(self.path + '.new')
+            self.assertNotEqual(self.source, expected)
+            self.assertIn(b'SDKROOT = iphoneos macosx;', expected)
+            parser = self._parse(SdkRootBlock, bytesMode=bytesMode,
+                                 editsOnly=True)
+            self.assertTrue(parser.wroteOutput)
+            self.assertEqual(expected, self._read(self.path + '.new'))
+            os.remove(self.path + '.new')
+
+    def testNoEdits(self):
+        parser = self._parse(FindSdkBlock, editsOnly=True)
+        self.assertFalse(parser.wroteOutput)
+        self.assertFalse(os.path.exists(self.path + '.new'))
+        parser = self._parse(FindSdkBlock, inPlace=True)
+        self.assertFalse(parser.wroteOutput)
+        self.assertEqual(self.source, self._read(self.path))
+
+    def testInPlace(self):
+        self._parse(SdkRootBlock)
+        expected = self._read(self.path + '.new')
+        os.remove(self.path + '.new')
+        os.chmod(self.path, 0o640)
+        parser = self._parse(SdkRootBlock, inPlace=True)
+        self.assertTrue(parser.wroteOutput)
+        self.assertEqual(expected, self._read(self.path))
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(self.path).st_mode))
+        # Nothing is left behind.
+        self.assertEqual(['project.pbxproj'], os.listdir(self.directory))
+
+    def testLineEndings(self):
+        # Small chunks, so lines (and '\r\n's) get split between them.
+        LineEditsModule.ChunkSize = 7
+        source = b'one\r\ntwo\rthree\nfour\r\nfive'
+        with open(self.path, 'wb') as stream:
+            stream.write(source)
+        spans = findLines(self.path, [4, 0, 2, 3, 9])
+        self.assertEqual([(0, 0, 5, b'\r\n'), (2, 9, 15, b'\n'),
+                          (3, 15, 21, b'\r\n'), (4, 21, 25, b'')], spans)
+        self.assertEqual([(1, 5, 15, b'\n')],
+                         findLines(self.path, [1], universal=False))
+
+        edits = LineEdits()
+        edits.record(0, 'ONE\n')
+        edits.record(3, 'added\nfour\n')
+        edits.record(4, 'FIVE')
+        newPath = self.path + '.new'
+        self.assertTrue(edits.apply(self.path, newPath))
+        self.assertEqual(b'ONE\r\ntwo\rthree\nadded\r\nfour\r\nFIVE',
+                         self._read(newPath))
+
+    def testCopySpan(self):
+        target = os.path.join(self.directory, 'copy')
+        for copier in LineEditsModule._Copiers:
+            copiers = LineEditsModule._Copiers
+            LineEditsModule._Copiers = [copier]
+            try:
+                with open(self.path, 'rb') as source, \
+                     open(target, 'wb', buffering=0) as dest:
+                    copySpan(source.fileno(), dest.fileno(), 10, 100)
+                    copySpan(source.fileno(), dest.fileno(), 500)
+            finally:
+                LineEditsModule._Copiers = copiers
+            self.assertEqual(self.source[10:110] + self.source[500:],
+                             self._read(target), copier.__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
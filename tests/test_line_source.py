@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+from BlockEx.LineSource import ChunkedLineSource, openLineSource
+from tests.test_one_line import OneLineBlock, OneLineParser
+
+import io
+import os
+import tempfile
+
+import unittest
+
+
+class TestLineSource(unittest.TestCase):
+
+    def setUp(self):
+        self.text = 'first line\nsecond éè line\r\nthird\rfourth'
+        handle, self.path = tempfile.mkstemp()
+        with os.fdopen(handle, 'wb') as stream:
+            stream.write(self.text.encode('utf-8'))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def testSmallChunks(self):
+        expected = ['first line\n', 'second éè line\n', 'third\n',
+                    'fourth']
+        data = self.text.encode('utf-8')
+        # Every chunk size splits the multibyte characters or the '\r\n'
+        # somewhere.
+        for chunkSize in range(1, len(data) + 1):
+            source = ChunkedLineSource(io.BytesIO(data), chunkSize=chunkSize)
+            self.assertEqual(expected, list(source.iterLines()),
+                             'Chunk size %d' % chunkSize)
+
+    def testReadline(self):
+        for useMmap in (False, True):
+            source = openLineSource(self.path, chunkSize=4, useMmap=useMmap)
+            lines = []
+            line = source.readline()
+            while line:
+                lines.append(line)
+                line = source.readline()
+            source.close()
+            with open(self.path, 'r', encoding='utf-8') as stream:
+                self.assertEqual(stream.readlines(), lines)
+
+    def testChunkedParse(self):
+        for useMmap in (False, True):
+            olParser = OneLineParser('tests/easy.test', process=False,
+                                     chunkSize=8, useMmap=useMmap)
+            olParser.isCooperative = False
+            olParser.blockMatchers = [OneLineBlock(), ]
+
+            olParser.parse()
+            self.assertEqual(2, olParser.numMatches, 'Wrong number of matches')
+
+
+if __name__ == '__main__':
+    unittest.main()
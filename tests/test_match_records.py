@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+from BlockEx.Parser import FileStreamParser, MatchRecord
+from BlockEx.BlockMatchex import PatternMatchex, MultiPatternMatchex
+from BlockEx.BlockBase import BlockBase
+
+import re
+
+import unittest
+
+
+class SdkBlock(BlockBase):
+    def __init__(self):
+        matchex = PatternMatchex(
+            blockRegex=r'(\s+)(SDKROOT) = ([a-z]+)(\d+\.\d+)?;')
+        super(SdkBlock, self).__init__(openingRegexStrings=[],
+                                       blockMatchex=matchex,
+                                       endingRegexString=r'\s+\};')
+
+
+class FrameworkBlock(BlockBase):
+    def __init__(self):
+        matchex = MultiPatternMatchex(blockRegex=r'(\w+)\.framework')
+        super(FrameworkBlock, self).__init__(openingRegexStrings=[],
+                                             blockMatchex=matchex,
+                                             endingRegexString=None)
+
+
+class TestMatchRecords(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/project.pbxproj', 'r', encoding='utf-8') as stream:
+            self.lines = stream.readlines()
+
+    def _records(self, matchers, bytesMode=False):
+        parser = FileStreamParser('tests/project.pbxproj', process=False,
+                                  bytesMode=bytesMode)
+        parser.blockMatchers = matchers
+        return parser.iterMatches()
+
+    def testPatternGroups(self):
+        matchex = PatternMatchex(blockRegex=r'(a)(b)(c)')
+        matchex.matchLine('abc', matchex.testMatch('abc'))
+        self.assertEqual(['a', 'b', 'c'], matchex.matchStrings)
+        self.assertEqual([('a', (0, 1)), ('b', (1, 2)), ('c', (2, 3))],
+                         matchex.groups)
+
+    def testRecords(self):
+        block = SdkBlock()
+        records = list(self._records([block]))
+        expected = []
+        for number, line in enumerate(self.lines):
+            match = re.match(r'(\s+)(SDKROOT) = ([a-z]+)(\d+\.\d+)?;', line)
+            if match:
+                expected.append(MatchRecord(
+                    block, number, match.groups(),
+                    tuple(match.span(i) for i in range(1, 5))))
+        self.assertEqual(expected, records)
+        self.assertEqual(('SDKROOT', 'macosx', '10.12'),
+                         records[-1].groups[1:])
+
+    def testBytesMode(self):
+        records = list(self._records([FrameworkBlock()]))
+        bytesRecords = list(self._records([FrameworkBlock()], bytesMode=True))
+        self.assertEqual([record[1:] for record in records],
+                         [record[1:] for record in bytesRecords])
+        self.assertEqual(('FFKit', 'FFKit'), records[0].groups)
+        self.assertEqual(len(records[0].groups), len(records[0].spans))
+
+    def testStopEarly(self):
+        records = self._records([SdkBlock()])
+        first = next(records)
+        self.assertEqual(522, first.lineNumber)
+        records.close()
+        self.assertEqual([], list(records))
+        self.assertTrue(first.matcher.blockMatchex.matchFound)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+from BlockEx.BlockMatchex import PatternMatchex
+from BlockEx.BlockBase import BlockBase
+from BlockEx.MatcherIndex import MatcherIndex, MaxScannedLiterals
+from tests.test_matcher_set import NameBlock, RecordingParser, SdkBlock, \
+    SettingBlock
+
+import unittest
+
+
+Sections = ['PBXBuildFile', 'PBXFileReference', 'PBXFrameworksBuildPhase',
+            'PBXGroup', 'PBXNativeTarget', 'PBXProject',
+            'PBXSourcesBuildPhase', 'PBXTargetDependency',
+            'XCBuildConfiguration', 'XCConfigurationList']
+
+
+# Opens on the isa line of a section, and finds a setting in it.
+class SectionBlock(BlockBase):
+    def __init__(self, section, key):
+        matchex = PatternMatchex(blockRegex=r'\s+%s = (.+);' % key)
+        super(SectionBlock, self).__init__(
+            openingRegexStrings=[r'\s+isa = %s;' % section],
+            blockMatchex=matchex,
+            endingRegexString=r'\s+\};')
+
+
+# Overriding _processBlock turns the index off, so every matcher sees every
+# line.
+class UnindexedParser(RecordingParser):
+    def _processBlock(self, line, block):
+        return super(UnindexedParser, self)._processBlock(line, block)
+
+
+def makeMatchers():
+    matchers = [SdkBlock('Debug'), SdkBlock('Release'), SettingBlock(),
+                NameBlock()]
+    for section in Sections:
+        for key in ('name', 'path', 'isa', 'buildSettings'):
+            matchers.append(SectionBlock(section, key))
+    return matchers
+
+
+class TestMatcherIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+
+    def onOpeningMatch(self, index, match):
+        self.events.append(('open', index))
+
+    def onRegexMatch(self, match):
+        self.events.append(('regex', ))
+
+    def onClosingMatch(self, match):
+        self.events.append(('close', ))
+
+    def _parse(self, parserClass, isCooperative, compileMatchers=False):
+        self.events = []
+        parser = parserClass('tests/project.pbxproj', process=False)
+        parser.isCooperative = isCooperative
+        parser.compileMatchers = compileMatchers
+        parser.blockMatchers = makeMatchers()
+        for matcher in parser.blockMatchers:
+            matcher.delegate = self
+        parser.parse()
+        return getattr(parser, 'matches', []), self.events
+
+    def testSameResults(self):
+        for isCooperative in (True, False):
+            expected = self._parse(UnindexedParser, isCooperative)
+            self.assertTrue(len(expected[0]) > 0, 'No matches to compare')
+            for compileMatchers in (False, True):
+                indexed = self._parse(RecordingParser, isCooperative,
+                                      compileMatchers)
+                self.assertEqual(expected, indexed,
+                                 'Indexed matchers differ (cooperative: %s, '
+                                 'compiled: %s)' %
+                                 (isCooperative, compileMatchers))
+
+    def testCandidates(self):
+        matchers = makeMatchers()
+        index = MatcherIndex(matchers)
+        # Few enough literals to check one at a time
+        self.assertIsNone(index._automaton)
+        line = '\t\t\tisa = PBXGroup;\n'
+        candidates = index.candidates(line)
+        # The matchers without an opening literal, and the PBXGroup ones.
+        self.assertEqual(matchers[2:4], candidates[:2])
+        self.assertEqual(2 + 4, len(candidates))
+        for matcher in candidates[2:]:
+            self.assertIsNotNone(matcher.openingRegexes[0].match(line))
+        # Without a literal, only the ones without one are candidates.
+        self.assertEqual(matchers[2:4], index.candidates('\t\t};\n'))
+
+    def testAutomaton(self):
+        matchers = [SectionBlock('PBXThing%d' % i, 'name')
+                    for i in range(MaxScannedLiterals + 1)]
+        index = MatcherIndex(matchers)
+        self.assertIsNotNone(index._automaton)
+        line = '\t\t\tisa = PBXThing3;\n'
+        self.assertEqual([matchers[3]], index.candidates(line))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+from BlockEx.Parser import FileStreamParser
+from BlockEx.BlockMatchex import PatternMatchex, FindAllMatchex
+from BlockEx.BlockBase import BlockBase
+
+import re
+
+import unittest
+
+
+class SdkBlock(BlockBase):
+    def __init__(self, configuration='Debug'):
+        openers = [r'\s+\w+ /\* %s \*/ = \{' % configuration,
+                   r'\s+isa = XCBuildConfiguration',
+                   r'\s+buildSettings = \{']
+        matchex = PatternMatchex(blockRegex=r'\s+SDKROOT = (\w+);')
+        super(SdkBlock, self).__init__(openingRegexStrings=openers,
+                                       blockMatchex=matchex,
+                                       endingRegexString=r'\s+\};')
+
+
+class SettingBlock(BlockBase):
+    def __init__(self):
+        matchex = FindAllMatchex(blockRegex=r'(CLANG_\w+)')
+        super(SettingBlock, self).__init__(openingRegexStrings=[],
+                                           blockMatchex=matchex,
+                                           endingRegexString=None)
+
+
+class NameBlock(BlockBase):
+    def __init__(self):
+        matchex = PatternMatchex(blockRegex=r'\s+name = (debug);',
+                                 flags=re.IGNORECASE)
+        super(NameBlock, self).__init__(openingRegexStrings=[],
+                                        blockMatchex=matchex,
+                                        endingRegexString=None)
+
+
+class RecordingParser(FileStreamParser):
+    def _handleLine(self, matcher):
+        if not hasattr(self, 'matches'):
+            setattr(self, 'matches', [])
+        self.matches.append((self.blockMatchers.index(matcher),
+                             str(matcher.blockMatchex.groups)))
+
+
+class TestCompiledMatcherSet(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+
+    def onOpeningMatch(self, index, match):
+        self.events.append(('open', index))
+
+    def onRegexMatch(self, match):
+        self.events.append(('regex', ))
+
+    def onClosingMatch(self, match):
+        self.events.append(('close', ))
+
+    def _parse(self, compileMatchers, isCooperative):
+        self.events = []
+        parser = RecordingParser('tests/project.pbxproj', process=False)
+        parser.compileMatchers = compileMatchers
+        parser.isCooperative = isCooperative
+        parser.blockMatchers = [SdkBlock('Debug'), SdkBlock('Release'),
+                                SettingBlock(), NameBlock()]
+        for matcher in parser.blockMatchers:
+            matcher.delegate = self
+        parser.parse()
+        return getattr(parser, 'matches', []), self.events
+
+    def testSameResults(self):
+        for isCooperative in (True, False):
+            expected = self._parse(False, isCooperative)
+            compiled = self._parse(True, isCooperative)
+            self.assertTrue(len(expected[0]) > 0, 'No matches to compare')
+            self.assertEqual(expected, compiled,
+                             'Compiled matchers differ (cooperative: %s)' %
+                             isCooperative)
+
+
+if __name__ == '__main__':
+    unittest.main()
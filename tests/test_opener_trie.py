@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+from BlockEx.Parser import FileStreamParser
+from BlockEx.BlockMatchex import PatternMatchex
+from BlockEx.BlockBase import BlockBase
+from BlockEx.OpenerTrie import OpenerTrie
+
+import unittest
+
+
+DebugOpeners = [r'\s+\w+ /\* Debug \*/ = \{',
+                r'\s+isa = XCBuildConfiguration',
+                r'\s+buildSettings = \{']
+
+
+# The Debug build settings, each looking for a different setting.
+class DebugSettingBlock(BlockBase):
+    def __init__(self, key, openers=DebugOpeners):
+        matchex = PatternMatchex(blockRegex=r'\s+%s = (.+);' % key)
+        super(DebugSettingBlock, self).__init__(openingRegexStrings=openers,
+                                                blockMatchex=matchex,
+                                                endingRegexString=r'\s+\};')
+
+
+class SettingsParser(FileStreamParser):
+    def _handleLine(self, matcher):
+        self.matches.append((self.blockMatchers.index(matcher),
+                             self.lineNumber,
+                             matcher.blockMatchex.matchStrings[0]))
+
+
+# Runs each matcher's opening regexes itself.
+class UnsharedParser(SettingsParser):
+    def _prepareParse(self):
+        super(UnsharedParser, self)._prepareParse()
+        self._openerTrie.release()
+
+
+def makeMatchers():
+    # The last one shares the first two openers.
+    return [DebugSettingBlock('SDKROOT'),
+            DebugSettingBlock('ONLY_ACTIVE_ARCH'),
+            DebugSettingBlock('SWIFT_OPTIMIZATION_LEVEL'),
+            DebugSettingBlock('PRODUCT_NAME'),
+            DebugSettingBlock('MTL_ENABLE_DEBUG_INFO',
+                              DebugOpeners[:2] + [r'\s+buildSettings =.*'])]
+
+
+class TestOpenerTrie(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+
+    def onOpeningMatch(self, index, match):
+        self.events.append(('open', index))
+
+    def onRegexMatch(self, match):
+        self.events.append(('regex', ))
+
+    def onClosingMatch(self, match):
+        self.events.append(('close', ))
+
+    def _parse(self, parserClass, isCooperative):
+        self.events = []
+        parser = parserClass('tests/project.pbxproj', process=False)
+        parser.isCooperative = isCooperative
+        parser.matches = []
+        parser.blockMatchers = makeMatchers()
+        for matcher in parser.blockMatchers:
+            matcher.delegate = self
+        parser.parse()
+        return parser, (parser.matches, self.events)
+
+    def testTrie(self):
+        matchers = makeMatchers()
+        trie = OpenerTrie(matchers)
+        # Three openers shared by all of them, the last one's own third
+        # opener, and an ending after each of the third openers.
+        self.assertEqual(6, len(trie.nodes))
+        self.assertEqual(1, len(trie.roots))
+        self.assertIs(matchers[0]._openers[2], matchers[3]._openers[2])
+        self.assertIs(matchers[0]._openers[3], matchers[3]._openers[3])
+        self.assertIs(matchers[0]._openers[1], matchers[4]._openers[1])
+        self.assertIsNot(matchers[0]._openers[2], matchers[4]._openers[2])
+        trie.release()
+        self.assertIsNone(matchers[0]._openers)
+
+    def testSameResults(self):
+        for isCooperative in (True, False):
+            _, expected = self._parse(UnsharedParser, isCooperative)
+            parser, shared = self._parse(SettingsParser, isCooperative)
+            self.assertTrue(len(expected[0]) > 0, 'No matches to compare')
+            self.assertEqual(expected, shared)
+            stats = parser.getOpenerStats()
+            if isCooperative:
+                self.assertTrue(stats['evaluations'] * 2 < stats['lookups'])
+            else:
+                # Only one matcher opens at a time, so little is shared.
+                self.assertTrue(stats['evaluations'] <= stats['lookups'])
+        # Every matcher got the callbacks for its openers, for each of the
+        # Debug build settings.
+        _, cooperative = self._parse(SettingsParser, True)
+        with open('tests/project.pbxproj', 'r', encoding='utf-8') as stream:
+            numDebug = stream.read().count('/* Debug */ = {')
+        self.assertEqual(len(makeMatchers()) * numDebug,
+                         cooperative[1].count(('open', 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
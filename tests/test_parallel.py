@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+from BlockEx.Parallel import findSplits, parseFiles
+from BlockEx.Parser import FileStreamParser
+from tests.test_matcher_set import SdkBlock, SettingBlock
+
+import os
+import shutil
+import tempfile
+
+import unittest
+
+
+def makeMatchers():
+    return [SdkBlock('Debug'), SdkBlock('Release'), SettingBlock()]
+
+
+class TestParseFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(self.directory, 'project%d.pbxproj' % i)
+            shutil.copy('tests/project.pbxproj', path)
+            self.paths.append(path)
+        self.paths.append(os.path.join(self.directory, 'missing.pbxproj'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testParallelMatchesSerial(self):
+        serial = dict((result.path, result) for result in
+                      parseFiles(self.paths, makeMatchers, maxWorkers=0))
+        parallel = dict((result.path, result) for result in
+                        parseFiles(self.paths, makeMatchers, maxWorkers=2,
+                                   filesPerChunk=2))
+        self.assertEqual(sorted(self.paths), sorted(parallel))
+        for path in self.paths[:-1]:
+            self.assertIsNone(parallel[path].error)
+            self.assertTrue(len(parallel[path].matches) > 0)
+            self.assertEqual(serial[path].matches, parallel[path].matches)
+        self.assertIsNotNone(parallel[self.paths[-1]].error)
+
+    def testProcess(self):
+        for result in parseFiles(self.paths[:2], makeMatchers, process=True,
+                                 maxWorkers=2):
+            self.assertEqual(result.path + '.new', result.newPath)
+            self.assertTrue(os.path.exists(result.newPath))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class ArchsFileParser(FileStreamParser):
+    def _handleLine(self, matcher):
+        self.matches.append((self.blockMatchers.index(matcher),
+                             self.lineNumber,
+                             list(matcher.blockMatchex.groups)))
+
+
+def makeBlockMatchers():
+    return [SdkBlock('Debug'), SdkBlock('Release')]
+
+
+class TestParseParallel(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.pbxproj')
+        with open('tests/project.pbxproj', 'rb') as stream:
+            data = stream.read()
+        with os.fdopen(handle, 'wb') as stream:
+            for _ in range(8):
+                stream.write(data)
+
+    def tearDown(self):
+        for path in (self.path, self.path + '.new'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _serial(self, matchers):
+        parser = ArchsFileParser(self.path, process=True)
+        parser.matches = []
+        parser.blockMatchers = matchers
+        parser.parse()
+        with open(self.path + '.new', 'rb') as stream:
+            return parser.matches, stream.read()
+
+    def _parallel(self, matcherFactory, resyncRegex=None):
+        parser = FileStreamParser(self.path, process=True)
+        parser.blockMatchers = matcherFactory()
+        matches = parser.parseParallel(maxWorkers=2, numRanges=5,
+                                       resyncRegex=resyncRegex)
+        with open(self.path + '.new', 'rb') as stream:
+            return [(m.matcherIndex, m.lineNumber, m.groups)
+                    for m in matches], stream.read()
+
+    def testSplitAtEndings(self):
+        expected = self._serial(makeBlockMatchers())
+        self.assertEqual(32, len(expected[0]))
+        self.assertEqual(expected, self._parallel(makeBlockMatchers))
+        splits = findSplits(self.path, makeBlockMatchers(), 5)
+        self.assertEqual(5, len(splits))
+
+    def testResync(self):
+        # SettingBlock has no ending, so we only split at the resync lines.
+        expected = self._serial(makeMatchers())
+        self.assertEqual(expected,
+                         self._parallel(makeMatchers, r'// !\$\*UTF8\*\$!'))
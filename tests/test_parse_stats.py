@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+from tests.test_matcher_set import NameBlock, RecordingParser, SdkBlock, \
+    SettingBlock
+
+import unittest
+
+
+# The blocks without openers are always current, so they get their own
+# parse.
+def makeMatchers():
+    return [SdkBlock('Debug'), SdkBlock('Release')]
+
+
+class TestParseStats(unittest.TestCase):
+
+    def _parse(self, instrument, matchers=None, **kwargs):
+        parser = RecordingParser('tests/project.pbxproj', process=False,
+                                 **kwargs)
+        parser.matches = []
+        parser.instrument = instrument
+        parser.blockMatchers = matchers or makeMatchers()
+        parser.parse()
+        return parser
+
+    def testOff(self):
+        parser = self._parse(False)
+        self.assertIsNone(parser.stats())
+        self.assertNotIn('_processBlock', parser.__dict__)
+
+    def testCounts(self):
+        expected = self._parse(False).matches
+        parser = self._parse(True)
+        self.assertEqual(expected, parser.matches)
+        stats = parser.stats()
+        with open('tests/project.pbxproj', 'r', encoding='utf-8') as stream:
+            numLines = len(stream.readlines())
+        self.assertEqual(numLines, stats['lines'])
+        self.assertIsNone(stats['ioSeconds'])
+        self.assertTrue(stats['readSeconds'] > 0)
+        self.assertEqual(['SdkBlock', 'SdkBlock'],
+                         [matcher['name'] for matcher in stats['matchers']])
+        for index, matcher in enumerate(stats['matchers']):
+            numMatches = len([match for match in parser.matches
+                              if match[0] == index])
+            self.assertEqual(numMatches, matcher['blockHits'])
+            self.assertTrue(matcher['openingHits'] <= matcher['openingTests'])
+            self.assertTrue(matcher['endingHits'] <= matcher['endingTests'])
+            self.assertTrue(matcher['seconds'] > 0)
+        debug = stats['matchers'][0]
+        # Every Debug configuration opened and closed the block.
+        self.assertTrue(debug['opened'] > 0)
+        self.assertEqual(debug['opened'], debug['completed'])
+        self.assertEqual(debug['completed'], debug['endingHits'])
+        self.assertEqual(debug['opened'] * 3, debug['openingHits'])
+
+    def testNoOpeners(self):
+        parser = self._parse(True, [SettingBlock(), NameBlock()])
+        # Without an ending, each match completes the block, on the next line.
+        name = parser.stats()['matchers'][1]
+        self.assertTrue(name['blockHits'] > 0)
+        self.assertEqual(0, name['openingTests'])
+        self.assertEqual(0, name['endingTests'])
+        self.assertEqual(name['blockHits'], name['completed'])
+        self.assertEqual(name['lines'], name['blockTests'])
+
+    def testChunkedReads(self):
+        stats = self._parse(True, chunkSize=4096).stats()
+        self.assertIsNotNone(stats['ioSeconds'])
+        self.assertAlmostEqual(stats['readSeconds'],
+                               stats['ioSeconds'] + stats['decodeSeconds'])
+
+
+if __name__ == '__main__':
+    unittest.main()
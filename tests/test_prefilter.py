@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+from BlockEx.Parser import FileStreamParser
+from BlockEx.BlockMatchex import PatternMatchex
+from BlockEx.BlockBase import BlockBase
+from BlockEx.Prefilter import requiredLiterals
+
+import re
+
+import unittest
+
+
+class ArchsBlock(BlockBase):
+    def __init__(self):
+        openers = [r'\s+\w+ /\* Debug \*/ = \{',
+                   r'\s+isa = XCBuildConfiguration',
+                   r'\s+buildSettings = \{']
+        matchex = PatternMatchex(blockRegex=r'\s+"VALID_ARCHS\[sdk=\*\]" = "(.+)";')
+        super(ArchsBlock, self).__init__(openingRegexStrings=openers,
+                                         blockMatchex=matchex,
+                                         endingRegexString=r'\s+\};')
+
+
+class ArchsParser(FileStreamParser):
+    def _handleLine(self, matcher):
+        self.archs = matcher.blockMatchex.matchStrings[0]
+
+
+class TestPrefilter(unittest.TestCase):
+
+    def testRequiredLiterals(self):
+        literals = requiredLiterals(re.compile(r'\s+VALID_ARCHS\s+=\s+"(.+)";'))
+        self.assertEqual(['VALID_ARCHS', '";'], literals)
+        literals = requiredLiterals(re.compile(rb'\s+isa = XCBuildConfiguration'))
+        self.assertEqual([b'isa = XCBuildConfiguration'], literals)
+        # Alternatives and case insensitive patterns don't require anything
+        self.assertEqual([], requiredLiterals(re.compile(r'(Debug|Release)')))
+        self.assertEqual([], requiredLiterals(re.compile(r'debug',
+                                                         re.IGNORECASE)))
+
+    def testParseStats(self):
+        parser = ArchsParser('tests/project.pbxproj', process=False)
+        parser.blockMatchers = [ArchsBlock(), ]
+        parser.parse()
+
+        self.assertEqual('arm64 armv7 armv7s x86_64', parser.archs)
+        stats = parser.getPrefilterStats()
+        self.assertTrue(stats['checked'] > 0, 'Prefilters were not used')
+        self.assertTrue(stats['rejected'] > 0, 'Prefilters rejected nothing')
+        self.assertTrue(0.0 < stats['hitRate'] <= 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
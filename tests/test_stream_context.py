@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+from BlockEx.Parser import BufferStreamParser, FileStreamParser, \
+    StreamContext
+from tests.test_prefilter import ArchsBlock
+
+import unittest
+
+
+class ContextFileParser(FileStreamParser, StreamContext):
+    def __init__(self, path, maxLines, spillToDisk, keepOpenBlocks=False):
+        FileStreamParser.__init__(self, path, process=False)
+        StreamContext.__init__(self, maxLines, spillToDisk, keepOpenBlocks)
+        self.maxBuffered = 0
+
+    def bufferLine(self, line):
+        StreamContext.bufferLine(self, line)
+        self.maxBuffered = max(self.maxBuffered, len(self._lines))
+
+
+class ArchsBufferParser(BufferStreamParser):
+    def _handleLine(self, matcher):
+        self.archs = matcher.blockMatchex.matchStrings[0]
+
+
+class TestStreamContext(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/project.pbxproj', 'r', encoding='utf-8') as stream:
+            self.lines = stream.readlines()
+
+    def testSpill(self):
+        context = StreamContext(maxLines=50, spillToDisk=True)
+        for line in self.lines:
+            context.bufferLine(line)
+        self.assertEqual(50, len(context._lines))
+        self.assertEqual(len(self.lines) - 1, context.getCurrentLineNumber())
+        for number in (0, 1, 400, len(self.lines) - 51, len(self.lines) - 1):
+            self.assertEqual(self.lines[number], context.getLineAt(number))
+
+    def testDropWithoutSpill(self):
+        context = StreamContext(maxLines=10)
+        for line in self.lines:
+            context.bufferLine(line)
+        self.assertIsNone(context.getLineAt(0))
+        self.assertEqual(self.lines[-1],
+                         context.getLineAt(len(self.lines) - 1))
+
+    def testBufferParserOverSpilledLines(self):
+        parser = ContextFileParser('tests/project.pbxproj', 20, True)
+        parser.parse()
+        self.assertEqual(20, parser.maxBuffered)
+
+        bufferParser = ArchsBufferParser(parser, 0)
+        bufferParser.blockMatchers = [ArchsBlock(), ]
+        bufferParser.parse()
+        self.assertEqual('arm64 armv7 armv7s x86_64', bufferParser.archs)
+
+    def testKeepOpenBlocks(self):
+        # The Debug block is more than 40 lines long, so it stays in memory
+        # until it closes.
+        parser = ContextFileParser('tests/project.pbxproj', 5, False,
+                                   keepOpenBlocks=True)
+        parser.blockMatchers = [ArchsBlock(), ]
+        parser.parse()
+        self.assertTrue(parser.maxBuffered > 40)
+        self.assertEqual(5, len(parser._lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
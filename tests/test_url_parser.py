@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+from BlockEx.Parser import UrlStreamParser
+from BlockEx.BlockMatchex import PatternMatchex
+from BlockEx.BlockBase import BlockBase
+
+import gzip
+import http.server
+import threading
+import zlib
+
+import unittest
+
+
+Body = ''.join('<li>item %d: café 日本</li>\n' % i
+               for i in range(200))
+
+
+class BodyHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = Body.encode('utf-8')
+        encoding = None
+        accepted = self.headers.get('Accept-Encoding', '')
+        if self.path == '/gzip' and 'gzip' in accepted:
+            body = gzip.compress(body)
+            encoding = 'gzip'
+        elif self.path == '/deflate' and 'deflate' in accepted:
+            body = zlib.compress(body)
+            encoding = 'deflate'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ItemBlock(BlockBase):
+    def __init__(self):
+        matchex = PatternMatchex(blockRegex=r'<li>item (\d+): (.+)</li>')
+        super(ItemBlock, self).__init__(openingRegexStrings=[],
+                                        blockMatchex=matchex,
+                                        endingRegexString=None)
+
+
+class ItemParser(UrlStreamParser):
+    def _handleLine(self, matcher):
+        self.items.append(matcher.blockMatchex.matchStrings[1])
+
+
+def startServer(handlerClass):
+    server = http.server.HTTPServer(('127.0.0.1', 0), handlerClass)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+class TestUrlStreamParser(unittest.TestCase):
+
+    def setUp(self):
+        self.server = startServer(BodyHandler)
+        self.host = '127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _parse(self, path, **kwargs):
+        parser = ItemParser(self.host, **kwargs)
+        parser.items = []
+        parser.blockMatchers = [ItemBlock(), ]
+        status, _ = parser.setPath(path)
+        self.assertEqual(200, status)
+        parser.parse()
+        return parser
+
+    def testSplitCharacters(self):
+        # Small reads split the multibyte characters between chunks.
+        parser = self._parse('/', chunkSize=7)
+        self.assertEqual(200, len(parser.items))
+        self.assertTrue(all(item == 'café 日本'
+                            for item in parser.items))
+        self.assertEqual(Body.splitlines(True), parser._lines[:200])
+
+    def testCompressed(self):
+        for path in ('/gzip', '/deflate'):
+            parser = self._parse(path, acceptCompressed=True, chunkSize=64)
+            self.assertEqual(200, len(parser.items), path)
+            self.assertEqual('café 日本', parser.items[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()